@@ -0,0 +1,161 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask import has_app_context
+from sqlalchemy import insert
+
+from forksafe import per_process
+from models import db, ActivityLog
+from rollups import daily_rollup
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BufferedWriter:
+    """Moves inserts into model's table off the request path.
+
+    Requests enqueue rows in memory and a background thread writes them in
+    executemany batches whenever batch_size rows are waiting or
+    flush_interval seconds have passed. The queue is bounded: when it stays
+    full for put_timeout the caller writes its row synchronously, so a slow
+    disk slows requests down instead of growing memory. That write joins the
+    caller's open transaction if there is one: the caller may already hold
+    the SQLite write lock, which a second connection would wait on until
+    busy_timeout. Pending rows are flushed at interpreter exit.
+
+    Until init_app is called with buffering enabled (config_key), add()
+    puts the insert in the caller's session and rides on the caller's commit.
+    """
+
+    def __init__(self, model, config_key, app=None, batch_size=200, flush_interval=1.0, max_queue=10000, put_timeout=0.5):
+        self.model = model
+        self.config_key = config_key
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.app = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = per_process(self._start_thread)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if str(app.config.get(self.config_key, True)).lower() in ("0", "false", "no"):
+            return
+        self.app = app
+        atexit.register(self.close)
+
+    def start(self):
+        """Start this process's writer thread now instead of at the first add().
+
+        Under gevent, Thread.start() yields; from add() that happens while
+        the caller's transaction holds the SQLite write lock, and greenlets
+        in the same worker then block the process in the busy handler.
+        """
+        if self.app is not None:
+            self._thread()
+
+    def insert(self, conn, rows):
+        conn.execute(insert(self.model), rows)
+
+    def add(self, row):
+        if self.app is None:
+            self.insert(db.session, [row])
+            return
+        self._thread()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            if has_app_context() and db.session().in_transaction():
+                self.insert(db.session, [row])
+            else:
+                self._write([row])
+
+    def flush(self):
+        rows = self._drain(self._queue.qsize())
+        if rows:
+            self._write(rows)
+
+    def close(self):
+        # Let the writer thread finish the batch it is holding, then write
+        # whatever is still queued.
+        thread = self._thread.current()
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=self.put_timeout)
+            except queue.Full:
+                pass
+            else:
+                thread.join(self.flush_interval + 5)
+        self.flush()
+
+    def _start_thread(self):
+        thread = threading.Thread(target=self._run, name=f"{self.model.__tablename__}-writer", daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            rows, stopping = [first], False
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                rows.append(row)
+            self._write(rows)
+            if stopping:
+                return
+
+    def _drain(self, limit):
+        rows = []
+        while len(rows) < limit:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not _STOP:
+                rows.append(row)
+        return rows
+
+    def _write(self, rows):
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    self.insert(conn, rows)
+        except Exception:
+            log.exception("Dropped %d %s rows", len(rows), self.model.__tablename__)
+
+
+class ActivityLogWriter(BufferedWriter):
+    """ActivityLog rows, folded into the daily rollups in the same transaction."""
+
+    def __init__(self, app=None, **kwargs):
+        super().__init__(ActivityLog, "ACTIVITY_LOG_BUFFERED", app, **kwargs)
+
+    def log(self, subject, action, user_id, xp=0, timestamp=None, quiz=None):
+        # quiz is (correct, questions) for a completed quiz; it only goes to the rollups.
+        self.add({"subject": subject, "action": action, "user_id": user_id, "xp": xp, "timestamp": timestamp or datetime.utcnow(), "quiz": quiz})
+
+    def insert(self, conn, rows):
+        conn.execute(insert(ActivityLog), [{key: value for key, value in row.items() if key != "quiz"} for row in rows])
+        daily_rollup.apply(conn, rows)
+
+
+activity_log = ActivityLogWriter()
@@ -1,135 +1,359 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_from_directory, send_file
+from flask import Blueprint, Flask, current_app, render_template, request, jsonify, redirect, url_for, flash, send_from_directory, send_file, Response, stream_with_context
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import date, datetime, timedelta
+from datetime import datetime, timedelta
 import os
-import base64
+import fcntl
 import json
-from groq import Groq
+import time
+import hmac
+import click
 from dotenv import load_dotenv
-from fpdf import FPDF
-from pypdf import PdfReader
-from io import BytesIO
-from flask_compress import Compress
-
-from models import db, User, Note, ActivityLog, QuizScore
-from blog_data import blog_posts
+from sqlalchemy import func, select
+
+from models import db, User, Note, QuizScore, Document, Job
+from database import configure_database
+from activity import activity_log
+from leaderboard import leaderboard
+from pagecache import page_cache
+from usercache import user_cache
+from pdf_index import pdf_indexes
+from documents import document_store
+from llm import LLMError, LLMUnavailable, llm
+from budget import PromptTooLarge, check_input, completion_limit, fit_context, token_ledger
+from jobs import JobFailed, RetryJob, job_json, job_queue
+from imaging import MAX_UPLOAD_BYTES, ImageRejected, prepare_image
+from usage import quota_remaining, raise_daily_limit, reset_if_new_day, record_usage
+from cache import ResponseCache, cache_scope, normalize
+from singleflight import SingleFlight, flight_key
+from paging import keyset_page, page_size
+from search import notes_search
+from render import render_cache
+from metrics import metrics
+from assets import assets
+from quizbank import QUIZ_SIZE, InvalidQuiz, parse_quiz, quiz_bank
+from rollups import daily_rollup
 
 load_dotenv()
 
-app = Flask(__name__)
-Compress(app)
-
-# =========================
-# CONFIGURATION
-# =========================
-app.config['SECRET_KEY'] = os.environ.get("SECRET_KEY", "dev-secret-key-change-this")
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=365)
-app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=365)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db.init_app(app)
+main = Blueprint('main', __name__, cli_group=None)
 
 # =========================
 # LOGIN MANAGER
 # =========================
 login_manager = LoginManager()
-login_manager.login_view = 'login'
-login_manager.init_app(app)
+login_manager.login_view = 'main.login'
+
+user_cache.ttl = float(os.environ.get("USER_CACHE_TTL", 5))
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
+
+# Background jobs retry transient upstream failures with backoff instead of failing outright.
+job_queue.retry_on = (LLMUnavailable,)
+# LLMError messages are written for users; other failures are reported generically.
+job_queue.public_errors = (LLMError,)
 
 # =========================
-# GROQ INIT
+# APP FACTORY
 # =========================
-if not os.environ.get("GROQ_API_KEY"):
-    raise ValueError("GROQ_API_KEY not set in environment variables")
+# LLM_BACKEND=fake answers locally, for load tests without a Groq key.
+LLM_CONFIG_KEYS = ('GROQ_API_KEY', 'LLM_BACKEND', 'LLM_FAKE_LATENCY', 'LLM_FAKE_TOKENS', 'LLM_CONNECT_TIMEOUT',
+                   'LLM_READ_TIMEOUT', 'LLM_POOL_SIZE', 'LLM_MAX_RETRIES', 'LLM_RETRY_BACKOFF', 'LLM_RETRY_MAX_WAIT',
+                   'LLM_BREAKER_THRESHOLD', 'LLM_BREAKER_RESET', 'LLM_FLIGHT_DIR')
+
+def create_app(config=None):
+    """Build and configure the app; config overrides the environment.
+
+    Importing this module stays cheap: groq, fpdf and pypdf are loaded on
+    first use and Flask-Migrate only under the flask CLI. The schema is
+    created here, once per process, unless AUTO_CREATE_SCHEMA=0.
+    """
+    from flask_compress import Compress
+
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.environ.get("SECRET_KEY", "dev-secret-key-change-this")
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=365)
+    # Refuses larger bodies with a 413 before they are read, chunked ones included.
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get("MAX_CONTENT_LENGTH", MAX_UPLOAD_BYTES + 64 * 1024))
+    app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=365)
+    configure_database(app)
+    app.config['ACTIVITY_LOG_BUFFERED'] = os.environ.get("ACTIVITY_LOG_BUFFERED", "1")
+    app.config['ACTIVITY_RETENTION_DAYS'] = int(os.environ.get("ACTIVITY_RETENTION_DAYS", 90))
+    app.config['LLM_USAGE_BUFFERED'] = os.environ.get("LLM_USAGE_BUFFERED", "1")
+    app.config['JOB_WORKERS'] = int(os.environ.get("JOB_WORKERS", 2))
+    app.config['AUTO_CREATE_SCHEMA'] = os.environ.get("AUTO_CREATE_SCHEMA", "1")
+    app.config['SLOW_REQUEST_MS'] = float(os.environ.get("SLOW_REQUEST_MS", 0))
+    app.config['METRICS_TOKEN'] = os.environ.get("METRICS_TOKEN")
+    app.config['ASSETS_FINGERPRINT'] = os.environ.get("ASSETS_FINGERPRINT", "1")
+    # Canonical origin for sitemap links; never taken from the request's Host header.
+    app.config['SITE_URL'] = os.environ.get("SITE_URL") or "https://school-ai-assistance.onrender.com"
+    app.config['QUIZ_BANK_TARGET'] = int(os.environ.get("QUIZ_BANK_TARGET", 30))
+    app.config['QUIZ_WARM_INTERVAL'] = float(os.environ.get("QUIZ_WARM_INTERVAL", 300))
+    app.config['QUIZ_WARM_TOPICS'] = int(os.environ.get("QUIZ_WARM_TOPICS", 20))
+    app.config['QUIZ_WARM_HOURS'] = os.environ.get("QUIZ_WARM_HOURS")
+    for key in LLM_CONFIG_KEYS:
+        if os.environ.get(key):
+            app.config[key] = os.environ[key]
+    app.config.update(config or {})
+
+    Compress(app)
+    assets.init_app(app)
+    metrics.init_app(app)
+    db.init_app(app)
+    if click.get_current_context(silent=True) is not None:
+        # Only `flask db ...` needs it, and alembic is the slowest import we have.
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    activity_log.init_app(app)
+    daily_rollup.init_app(app)
+    token_ledger.init_app(app)
+    document_store.init_app(app)
+    render_cache.init_app(app)
+    job_queue.init_app(app)
+    leaderboard.init_app(app)
+    quiz_bank.init_app(app)
+    login_manager.init_app(app)
+    llm.init_app(app)
+    llm.on_usage = token_ledger.record
+    llm.on_call = metrics.llm_call
+    llm.on_retry = metrics.llm_retry
+    flights.init_app(app)
+    for name, cache in (('response', response_cache), ('page', page_cache), ('user', user_cache),
+                        ('render', render_cache), ('pdf_index', pdf_indexes), ('quiz_bank', quiz_bank)):
+        metrics.watch_cache(name, cache)
+    app.register_blueprint(main)
+
+    if str(app.config['AUTO_CREATE_SCHEMA']).lower() not in ('0', 'false', 'no'):
+        with app.app_context():
+            init_schema()
+    return app
+
+def init_schema():
+    # Every gunicorn worker gets here at boot; on a fresh database they would
+    # race to CREATE the same tables, so they take turns on a file lock.
+    os.makedirs(current_app.instance_path, exist_ok=True)
+    with open(os.path.join(current_app.instance_path, 'schema.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            db.create_all()
+            notes_search.install()
+            daily_rollup.install()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+# =========================
+# RESPONSE CACHE
+# =========================
+response_cache = ResponseCache(
+    maxsize=int(os.environ.get("RESPONSE_CACHE_SIZE", 2048)),
+    ttl=int(os.environ.get("RESPONSE_CACHE_TTL", 6 * 3600)),
+    similarity=float(os.environ.get("RESPONSE_CACHE_SIMILARITY", 0)),
+)
+
+# Identical prompts arriving together (a whole class generating the same quiz)
+# share one upstream completion, across gunicorn workers via instance/flights.
+flights = SingleFlight()
+
+def cached_completion(scope, text, messages, model, parse=None, **kwargs):
+    # parse runs before the value is stored, so a malformed completion is
+    # raised to the caller and never cached.
+    value = response_cache.get(scope, text)
+    if value is None:
+        def fetch():
+            content = llm.complete(messages, model, **kwargs)
+            return parse(content) if parse else content
+        value = flights.do(flight_key(scope, normalize(text)), fetch)
+        response_cache.set(scope, text, value)
+    return value
 
 # =========================
 # HELPERS
 # =========================
-def add_xp(user, amount, subject=None, action=None):
-    if not user.xp: user.xp = 0
-    if not user.level: user.level = 1
-    user.xp += amount
-    new_level = (user.xp // 100) + 1
-    if new_level > user.level:
-        user.level = new_level
-        user.daily_limit += 1
-    log = ActivityLog(subject=subject, action=action, user_id=user.id)
-    db.session.add(log)
-    db.session.commit()
-
-def check_daily_reset(user):
-    if user.last_active_date != date.today():
-        user.questions_today = 0
-        user.daily_limit = 5
-        user.last_active_date = date.today()
-        db.session.commit()
+def limit_reached():
+    metrics.quota_rejected(request.url_rule.rule)
+    return jsonify({'error':'Daily limit reached','limit_reached':True}),403
+
+GENERIC_ERROR = "Something went wrong. Please try again."
+
+def llm_error(e):
+    # Upstream failures keep their status (429/502/503) so clients can back off.
+    response = jsonify({'error': e.message, 'retry': isinstance(e, LLMUnavailable)})
+    if e.retry_after:
+        response.headers['Retry-After'] = str(int(e.retry_after + 0.999))
+    return response, e.status
+
+def llm_options(route, user_id):
+    # Tags the call for the token ledger and caps the reply at the route's budget.
+    return {'route': route, 'user_id': user_id, 'max_tokens': completion_limit(route)}
+
+def usage_event(questions_left):
+    # Final SSE payload for a finished stream; None means a concurrent
+    # request used up the quota first.
+    if questions_left is None:
+        return {'error':'Daily limit reached','limit_reached':True}
+    return {'questions_left':questions_left}
+
+# Longest a client can hold /api/jobs/<id>/events open; it reconnects after.
+JOB_EVENTS_TIMEOUT = int(os.environ.get("JOB_EVENTS_TIMEOUT", 120))
+
+# Number of retrieved PDF chunks (~180 words each) sent with a question.
+PDF_CONTEXT_CHUNKS = int(os.environ.get("PDF_CONTEXT_CHUNKS", 6))
+
+# =========================
+# STREAMING
+# =========================
+def wants_stream(data=None):
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return str((data or {}).get('stream', '')).lower() in ('1', 'true')
+
+def sse(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+def event_stream(events):
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def stream_completion(messages, model, on_complete, cache=None, **kwargs):
+    # Tokens are flushed as server-sent events while Groq generates them.
+    # on_complete runs once with the full text, so quota/XP is committed a
+    # single time after the last token and its result is the final event.
+    # cache is an optional (scope, text) pair for the response cache.
+    def generate():
+        parts = []
+        try:
+            cached = response_cache.get(*cache) if cache else None
+            if cached is not None:
+                parts.append(cached)
+                yield sse({'token': cached})
+            else:
+                for delta in llm.stream(messages, model, **kwargs):
+                    parts.append(delta)
+                    yield sse({'token': delta})
+                if cache:
+                    response_cache.set(*cache, "".join(parts))
+            # The view's session was torn down before the body started streaming.
+            db.session.add(current_user._get_current_object())
+            yield sse(dict(on_complete("".join(parts)), done=True))
+        except LLMError as e:
+            yield sse({'error': e.message})
+        except Exception:
+            current_app.logger.exception("Streaming completion failed")
+            yield sse({'error': GENERIC_ERROR})
+    return event_stream(generate())
+
+# =========================
+# BACKGROUND JOBS
+# =========================
+def wants_job(data=None):
+    if request.args.get('job') in ('1', 'true'):
+        return True
+    return str((data or {}).get('job', '')).lower() in ('1', 'true')
+
+def enqueue_job(kind, payload):
+    job = job_queue.enqueue(kind, current_user.id, payload)
+    return jsonify(job_json(job)), 202
+
+def charge_job(user, amount, subject, action):
+    # Jobs charge only once their completion came back.
+    questions_left = record_usage(user, amount, subject=subject, action=action)
+    if questions_left is None:
+        metrics.quota_rejected('job')
+        raise JobFailed('Daily limit reached')
+    return questions_left
 
 # =========================
 # ROUTES
 # =========================
 
-@app.route('/robots.txt')
+@main.route('/robots.txt')
 def robots():
-    return send_from_directory(os.path.join(app.root_path, 'static'), 'robots.txt')
-
-@app.route('/sitemap.xml')
+    return send_from_directory(os.path.join(current_app.root_path, 'static'), 'robots.txt')
+
+# Pages listed in the sitemap, with their changefreq and priority. Only
+# add a page here once its template exists, or crawlers are sent to a 500.
+SITEMAP_PAGES = {
+    'main.index': ('weekly', '1.0'),
+    'main.blog': ('weekly', '0.8'),
+    'main.about': ('monthly', '0.8'),
+    'main.contact': ('monthly', '0.7'),
+    'main.privacy': ('yearly', '0.4'),
+    'main.terms': ('yearly', '0.4'),
+}
+
+@main.route('/sitemap.xml')
+@page_cache.cached
 def sitemap():
-    return send_from_directory(os.path.join(app.root_path, 'static'), 'sitemap.xml')
-
-@app.route('/')
+    # Blog entries come from blog_posts, so they can't drift; the page cache
+    # keeps the rendered XML. Links use SITE_URL only: the cached body is
+    # shared by every client, whatever Host header they sent.
+    from blog_data import blog_posts
+    site=current_app.config['SITE_URL'].rstrip('/')
+    posts=[(slug,datetime.strptime(post['date'],'%B %d, %Y').date()) for slug,post in blog_posts.items()]
+    newest=max((published for _,published in posts),default=None)
+    pages=[{'loc':site+url_for(endpoint),'lastmod':newest if endpoint in ('main.index','main.blog') else None,
+            'changefreq':changefreq,'priority':priority}
+           for endpoint,(changefreq,priority) in SITEMAP_PAGES.items()]
+    pages+=[{'loc':site+url_for('.blog_post',slug=slug),'lastmod':published,'changefreq':'monthly','priority':'0.6'} for slug,published in posts]
+    return Response(render_template('sitemap.xml',pages=pages),mimetype='application/xml')
+
+@main.route('/')
+@page_cache.cached
 def index():
     return render_template('index.html',
                            title="Free CBSE AI Tutor for Students Class 1 to College",
                            meta_description="AI Tutor is a free CBSE AI school assistance platform. Get instant doubt solving, AI-generated study notes, quizzes & progress tracking for students Class 1 to College.",
                            meta_keywords="CBSE AI tutor, free school AI assistance, NCERT help, class 1 to 12 AI tutor, AI doubt solving, online study tool India")
 
-@app.route('/blog')
+@main.route('/blog')
+@page_cache.cached
 def blog():
+    from blog_data import blog_posts
     return render_template('blog.html', posts=blog_posts,
                            title="Educational Blog - CBSE Tips & AI Study Guides",
                            meta_description="Read CBSE study tips, AI learning guides, and educational articles for students. Expert advice on scoring well in Class 10, 12, and beyond.",
                            meta_keywords="CBSE blog, education tips, AI study guide, school exam tips, NCERT solutions blog")
 
-@app.route('/blog/<slug>')
+@main.route('/blog/<slug>')
+@page_cache.cached
 def blog_post(slug):
+    from blog_data import blog_posts
     post = blog_posts.get(slug)
     if not post:
-        return redirect(url_for('blog'))
+        return redirect(url_for('.blog'))
     return render_template('blog_post.html', post=post,
                            title=post.get('title', 'Blog Post'),
                            meta_description=post.get('excerpt', 'Read this educational article on AI Tutor.')[:160],
                            meta_keywords=f"CBSE, {post.get('subject', 'education')}, AI tutor, school assistance")
 
-@app.route('/about')
+@main.route('/about')
+@page_cache.cached
 def about():
     return render_template('about.html',
                            title="About AI Tutor - CBSE School AI Assistance Platform",
                            meta_description="Learn about AI Tutor — a free AI-powered CBSE school assistance platform built by Rohan Singh for Indian students from Class 1 to College.",
                            meta_keywords="about AI tutor, CBSE AI platform, school AI assistance India, Rohan Singh AI tutor")
 
-@app.route('/privacy')
+@main.route('/privacy')
+@page_cache.cached
 def privacy():
     return render_template('privacy.html',
                            title="Privacy Policy - AI Tutor",
                            meta_description="Read the Privacy Policy for AI Tutor. We are committed to protecting your data and privacy as a student using our CBSE AI assistance platform.",
                            meta_keywords="privacy policy, AI tutor privacy, data protection, student data safety")
 
-@app.route('/terms')
+@main.route('/terms')
+@page_cache.cached
 def terms():
     return render_template('terms.html',
                            title="Terms of Service - AI Tutor",
                            meta_description="Review the Terms of Service for AI Tutor. Understanding the rules and guidelines for using our free CBSE AI assistance platform.",
                            meta_keywords="terms of service, AI tutor terms, user agreement, school AI assistance terms")
 
-@app.route('/contact')
+@main.route('/contact')
+@page_cache.cached
 def contact():
     return render_template('contact.html',
                            title="Contact Us - AI Tutor",
@@ -139,7 +363,7 @@ def contact():
 # -------------------------
 # AUTH ROUTES
 # -------------------------
-@app.route('/register', methods=['GET', 'POST'])
+@main.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -149,21 +373,21 @@ def register():
 
         if User.query.filter_by(username=username).first():
             flash('Username already exists', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('.register'))
 
         if User.query.filter_by(email=email).first():
             flash('Email already exists', 'error')
-            return redirect(url_for('register'))
+            return redirect(url_for('.register'))
 
         hashed_pw = generate_password_hash(password)
         new_user = User(username=username, email=email, password=hashed_pw, student_class=student_class)
         db.session.add(new_user)
         db.session.commit()
         login_user(new_user)
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('.dashboard'))
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@main.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -171,24 +395,24 @@ def login():
         user = User.query.filter_by(username=username).first()
         if user and check_password_hash(user.password, password):
             login_user(user, remember=True)
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('.dashboard'))
         else:
             flash('Invalid credentials', 'error')
     return render_template('login.html')
 
-@app.route('/logout')
+@main.route('/logout')
 @login_required
 def logout():
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 # -------------------------
 # DASHBOARD & USAGE
 # -------------------------
-@app.route('/dashboard')
+@main.route('/dashboard')
 @login_required
 def dashboard():
-    check_daily_reset(current_user)
+    reset_if_new_day(current_user)
     if current_user.account_created_at:
         delta = datetime.utcnow() - current_user.account_created_at
         account_age_days = max(delta.days, 1)
@@ -199,154 +423,288 @@ def dashboard():
                            user=current_user,
                            account_age=account_age_days,
                            usage_percent=usage_percent,
-                           remaining=current_user.daily_limit - current_user.questions_today)
+                           remaining=current_user.daily_limit - current_user.questions_today,
+                           summary=daily_rollup.summary(current_user.id))
+
+@main.route('/api/analytics')
+@login_required
+def analytics():
+    summary=daily_rollup.summary(current_user.id,days=min(max(request.args.get('days',30,type=int),1),365))
+    quiz_history=[{'topic':t['topic'],'score':f"{t['correct']}/{t['total']}",'accuracy':t['accuracy']} for t in summary['topics']]
+    return jsonify({'subjects':summary['subjects'],'quiz_history':quiz_history,'streak':summary['streak'],
+                    'xp':summary['xp'],'quiz_accuracy':summary['quiz_accuracy'],'trend':summary['trend']})
 
 # -------------------------
 # AI ROUTES
 # -------------------------
-@app.route('/api/ask', methods=['POST'])
+@main.route('/api/ask', methods=['POST'])
 @login_required
 def ask_ai():
-    check_daily_reset(current_user)
-    if current_user.questions_today >= current_user.daily_limit:
-        return jsonify({'error':'Daily limit reached','limit_reached':True}),403
+    if quota_remaining(current_user)<=0:
+        return limit_reached()
     data = request.json
-    question = data.get('question')
+    question = check_input('ask','question',data.get('question'))
     subject = data.get('subject','General')
     forbidden_subjects=['hindi','english literature','sanskrit']
     if subject.lower() in forbidden_subjects:
         return jsonify({'answer':"I do not answer questions related to Hindi, English Literature, or Sanskrit."})
     system_prompt=f"You are a helpful AI tutor for students. The student is in {current_user.student_class or 'Grade 1 to College'}. Provide clear explanations and code examples when needed."
     user_prompt=f"Subject: {subject}. Question: {question}"
+    messages=[{"role":"system","content":system_prompt},{"role":"user","content":user_prompt}]
+    scope=cache_scope('ask',subject,current_user.student_class,"llama-3.1-8b-instant",system_prompt)
+    if wants_stream(data):
+        return stream_completion(messages,"llama-3.1-8b-instant",
+                                 lambda answer: usage_event(record_usage(current_user,10,subject=subject,action="Asked Question")),
+                                 cache=(scope,question),temperature=0.7,**llm_options('ask',current_user.id))
     try:
-        chat_completion=client.chat.completions.create(
-            messages=[{"role":"system","content":system_prompt},{"role":"user","content":user_prompt}],
-            model="llama-3.1-8b-instant",
-            temperature=0.7
-        )
-        answer=chat_completion.choices[0].message.content
-        current_user.questions_today+=1
-        current_user.total_questions_asked=(current_user.total_questions_asked or 0)+1
-        add_xp(current_user,10,subject=subject,action="Asked Question")
-        return jsonify({'answer':answer,'questions_left':current_user.daily_limit-current_user.questions_today})
-    except Exception as e:
-        return jsonify({'error':str(e)}),500
+        answer=cached_completion(scope,question,messages,"llama-3.1-8b-instant",temperature=0.7,**llm_options('ask',current_user.id))
+        questions_left=record_usage(current_user,10,subject=subject,action="Asked Question")
+        if questions_left is None:
+            return limit_reached()
+        return jsonify({'answer':answer,'questions_left':questions_left})
+    except LLMError as e:
+        return llm_error(e)
+    except Exception:
+        current_app.logger.exception("AI request failed")
+        return jsonify({'error':GENERIC_ERROR}),500
 
 # -------------------------
 # NOTES
 # -------------------------
-@app.route('/api/generate-notes', methods=['POST'])
+def notes_prompt(student_class,subject,topic):
+    system_prompt=f"You are an expert educational notes generator. Create comprehensive, well-structured study notes for a student in {student_class or 'Grade 1 to College'}. Use Markdown formatting."
+    user_prompt=f"Subject: {subject}. Topic: {topic}. Please generate detailed study notes."
+    scope=cache_scope('notes',subject,student_class,"llama-3.1-8b-instant",system_prompt)
+    return scope,[{"role":"system","content":system_prompt},{"role":"user","content":user_prompt}]
+
+@job_queue.handler('notes')
+def notes_job(payload,user):
+    scope,messages=notes_prompt(user.student_class,payload['subject'],payload['topic'])
+    notes_content=cached_completion(scope,payload['topic'],messages,"llama-3.1-8b-instant",temperature=0.7,**llm_options('notes',user.id))
+    return {'notes':notes_content,'html':render_cache.html(notes_content),'questions_left':charge_job(user,20,payload['subject'],"Generated Notes")}
+
+@main.route('/api/generate-notes', methods=['POST'])
 @login_required
 def generate_notes():
-    check_daily_reset(current_user)
-    if current_user.questions_today>=current_user.daily_limit:
-        return jsonify({'error':'Daily limit reached','limit_reached':True}),403
+    if quota_remaining(current_user)<=0:
+        return limit_reached()
     data=request.json
-    topic=data.get('topic')
+    topic=check_input('notes','topic',data.get('topic'))
     subject=data.get('subject','General')
-    system_prompt=f"You are an expert educational notes generator. Create comprehensive, well-structured study notes for a student in {current_user.student_class or 'Grade 1 to College'}. Use Markdown formatting."
-    user_prompt=f"Subject: {subject}. Topic: {topic}. Please generate detailed study notes."
+    if wants_job(data):
+        return enqueue_job('notes',{'subject':subject,'topic':topic})
+    scope,messages=notes_prompt(current_user.student_class,subject,topic)
+    if wants_stream(data):
+        return stream_completion(messages,"llama-3.1-8b-instant",
+                                 lambda notes_content: dict(usage_event(record_usage(current_user,20,subject=subject,action="Generated Notes")),html=render_cache.html(notes_content)),
+                                 cache=(scope,topic),temperature=0.7,**llm_options('notes',current_user.id))
     try:
-        chat_completion=client.chat.completions.create(
-            messages=[{"role":"system","content":system_prompt},{"role":"user","content":user_prompt}],
-            model="llama-3.1-8b-instant",
-            temperature=0.7
-        )
-        notes_content=chat_completion.choices[0].message.content
-        current_user.questions_today+=1
-        current_user.total_questions_asked=(current_user.total_questions_asked or 0)+1
-        add_xp(current_user,20,subject=subject,action="Generated Notes")
-        return jsonify({'notes':notes_content,'questions_left':current_user.daily_limit-current_user.questions_today})
-    except Exception as e:
-        return jsonify({'error':str(e)}),500
+        notes_content=cached_completion(scope,topic,messages,"llama-3.1-8b-instant",temperature=0.7,**llm_options('notes',current_user.id))
+        questions_left=record_usage(current_user,20,subject=subject,action="Generated Notes")
+        if questions_left is None:
+            return limit_reached()
+        return jsonify({'notes':notes_content,'html':render_cache.html(notes_content),'questions_left':questions_left})
+    except LLMError as e:
+        return llm_error(e)
+    except Exception:
+        current_app.logger.exception("AI request failed")
+        return jsonify({'error':GENERIC_ERROR}),500
 
 # -------------------------
 # QUIZ
 # -------------------------
-@app.route('/api/generate-quiz', methods=['POST'])
+def quiz_prompt(student_class,subject,topic,count=QUIZ_SIZE):
+    system_prompt=f"You are an expert quiz generator. Create a {count}-question multiple choice quiz for a student in {student_class or 'Grade 1 to College'}. Return ONLY a JSON object with key 'quiz' containing {count} objects with 'question', 'options' (a list of four answers) and 'answer' (the exact text of the correct option)."
+    user_prompt=f"Subject: {subject}. Topic: {topic}. Generate a {count}-question quiz in JSON format."
+    scope=cache_scope('quiz',subject,student_class,"llama-3.1-8b-instant",system_prompt)
+    return scope,[{"role":"system","content":system_prompt},{"role":"user","content":user_prompt}]
+
+@quiz_bank.generator
+def warm_quiz(student_class,subject,topic,count):
+    # Straight to the LLM: the response cache would hand back questions the bank already has.
+    _,messages=quiz_prompt(student_class,subject,topic,count)
+    content=llm.complete(messages,"llama-3.1-8b-instant",temperature=0.9,response_format={"type":"json_object"},**llm_options('quiz',None))
+    return parse_quiz(content,minimum=1)
+
+@main.route('/api/generate-quiz', methods=['POST'])
 @login_required
 def generate_quiz():
-    check_daily_reset(current_user)
-    if current_user.questions_today>=current_user.daily_limit:
-        return jsonify({'error':'Daily limit reached','limit_reached':True}),403
+    if quota_remaining(current_user)<=0:
+        return limit_reached()
     data=request.json
-    topic=data.get('topic')
+    topic=check_input('quiz','topic',data.get('topic'))
     subject=data.get('subject','General')
-    system_prompt=f"You are an expert quiz generator. Create a 5-question multiple choice quiz for a student in {current_user.student_class or 'Grade 1 to College'}. Return ONLY a JSON object with key 'quiz' containing 5 objects with 'question','options' and 'answer'."
-    user_prompt=f"Subject: {subject}. Topic: {topic}. Generate a 5-question quiz in JSON format."
     try:
-        chat_completion=client.chat.completions.create(
-            messages=[{"role":"system","content":system_prompt},{"role":"user","content":user_prompt}],
-            model="llama-3.1-8b-instant",
-            temperature=0.7,
-            response_format={"type":"json_object"}
-        )
-        quiz_json=json.loads(chat_completion.choices[0].message.content)
-        current_user.questions_today+=1
-        current_user.total_questions_asked=(current_user.total_questions_asked or 0)+1
-        add_xp(current_user,15,subject=subject,action="Generated Quiz")
-        return jsonify({'quiz':quiz_json['quiz'],'questions_left':current_user.daily_limit-current_user.questions_today})
-    except Exception as e:
-        return jsonify({'error':str(e)}),500
+        quiz=quiz_bank.draw(current_user.student_class,subject,topic)
+        if quiz is None:
+            # The bank is dry for this topic: generate now and keep the questions.
+            scope,messages=quiz_prompt(current_user.student_class,subject,topic)
+            questions=cached_completion(scope,topic,messages,"llama-3.1-8b-instant",parse=parse_quiz,temperature=0.7,
+                                        response_format={"type":"json_object"},**llm_options('quiz',current_user.id))
+            quiz_bank.add(current_user.student_class,subject,topic,questions)
+            quiz=questions[:QUIZ_SIZE]
+        questions_left=record_usage(current_user,15,subject=subject,action="Generated Quiz")
+        if questions_left is None:
+            return limit_reached()
+        return jsonify({'quiz':quiz,'questions_left':questions_left})
+    except InvalidQuiz as e:
+        current_app.logger.warning("Malformed quiz for %r: %s",topic,e)
+        return jsonify({'error':'The AI returned a malformed quiz. Please try again.'}),502
+    except LLMError as e:
+        return llm_error(e)
+    except Exception:
+        current_app.logger.exception("AI request failed")
+        return jsonify({'error':GENERIC_ERROR}),500
 
 # -------------------------
 # PDF CHAT
 # -------------------------
-@app.route('/api/pdf-chat', methods=['POST'])
+def pdf_messages(index,question):
+    context=fit_context('pdf',index.context(question,k=PDF_CONTEXT_CHUNKS))
+    return [{"role":"system","content":"Use context to answer. Cite page numbers where helpful."},{"role":"user","content":f"Context: {context}\n\nQuestion: {question}"}]
+
+@job_queue.handler('pdf')
+def pdf_job(payload,user):
+    doc=Document.query.filter_by(id=payload['document_id'],user_id=user.id).first()
+    if doc is None or doc.status=='failed':
+        raise JobFailed('Document could not be read')
+    if doc.status!='ready':
+        raise RetryJob('Document is still processing')
+    answer=llm.complete(pdf_messages(document_store.index(doc),payload['question']),"llama-3.1-8b-instant",temperature=0.7,**llm_options('pdf',user.id))
+    return {'answer':answer,'questions_left':charge_job(user,20,"PDF Analysis","Consulted PDF")}
+
+@main.route('/api/pdf-chat', methods=['POST'])
 @login_required
 def pdf_chat():
-    check_daily_reset(current_user)
-    if 'pdf' not in request.files:
+    if quota_remaining(current_user)<=0:
+        return limit_reached()
+    data=request.form if (request.form or request.files) else (request.get_json(silent=True) or {})
+    question=check_input('pdf','question',data.get('question','Summarize'))
+    doc=None
+    if data.get('document_id'):
+        doc=Document.query.filter_by(id=data.get('document_id'),user_id=current_user.id).first()
+        if doc is None:
+            return jsonify({'error':'Document not found'}),404
+        if doc.status!='ready':
+            return jsonify({'error':'Document is not ready','status':doc.status}),409
+    elif 'pdf' not in request.files:
         return jsonify({'error':'No PDF uploaded'}),400
-    file=request.files['pdf']
-    question=request.form.get('question','Summarize')
+    if wants_job(data):
+        doc=doc or document_store.save(request.files['pdf'],current_user)
+        return enqueue_job('pdf',{'document_id':doc.id,'question':question})
     try:
-        reader=PdfReader(file)
-        text="".join([p.extract_text() for p in reader.pages[:5]])
-        chat_completion=client.chat.completions.create(
-            messages=[{"role":"system","content":"Use context to answer."},{"role":"user","content":f"Context: {text}\n\nQuestion: {question}"}],
-            model="llama-3.1-8b-instant",
-            temperature=0.7
-        )
-        answer=chat_completion.choices[0].message.content
-        current_user.questions_today+=1
-        current_user.total_questions_asked=(current_user.total_questions_asked or 0)+1
-        add_xp(current_user,20,subject="PDF Analysis",action="Consulted PDF")
-        return jsonify({'answer':answer,'questions_left':current_user.daily_limit-current_user.questions_today})
-    except Exception as e:
-        return jsonify({'error':str(e)}),500
+        index=document_store.index(doc) if doc else pdf_indexes.get_or_build(request.files['pdf'].stream)
+        messages=pdf_messages(index,question)
+        if wants_stream(data):
+            return stream_completion(messages,"llama-3.1-8b-instant",
+                                     lambda answer: usage_event(record_usage(current_user,20,subject="PDF Analysis",action="Consulted PDF")),
+                                     temperature=0.7,**llm_options('pdf',current_user.id))
+        answer=llm.complete(messages,"llama-3.1-8b-instant",temperature=0.7,**llm_options('pdf',current_user.id))
+        questions_left=record_usage(current_user,20,subject="PDF Analysis",action="Consulted PDF")
+        if questions_left is None:
+            return limit_reached()
+        return jsonify({'answer':answer,'questions_left':questions_left})
+    except LLMError as e:
+        return llm_error(e)
+    except Exception:
+        current_app.logger.exception("AI request failed")
+        return jsonify({'error':GENERIC_ERROR}),500
+
+# -------------------------
+# DOCUMENTS (upload once, ask many)
+# -------------------------
+def document_json(doc):
+    return {'document_id':doc.id,'filename':doc.filename,'status':doc.status,'page_count':doc.page_count,'error':doc.error}
+
+@main.route('/api/documents', methods=['POST'])
+@login_required
+def upload_document():
+    if 'pdf' not in request.files:
+        return jsonify({'error':'No PDF uploaded'}),400
+    doc=document_store.save(request.files['pdf'],current_user)
+    return jsonify(document_json(doc)),(202 if doc.status=='processing' else 200)
+
+@main.route('/api/documents/<int:id>')
+@login_required
+def get_document(id):
+    doc=Document.query.filter_by(id=id,user_id=current_user.id).first()
+    if doc is None:
+        return jsonify({'error':'Document not found'}),404
+    return jsonify(document_json(doc))
 
 # -------------------------
 # VISION ASK
 # -------------------------
-@app.route('/api/vision-ask', methods=['POST'])
+def vision_messages(image_url):
+    return [{"role":"user","content":[{"type":"text","text":"Solve the problem in this image."},{"type":"image_url","image_url":{"url":image_url}}]}]
+
+@job_queue.handler('vision')
+def vision_job(payload,user):
+    answer=llm.complete(vision_messages(payload['image_url']),"llama-3.2-11b-vision-preview",temperature=0.7,**llm_options('vision',user.id))
+    return {'answer':answer,'questions_left':charge_job(user,15,"Image OCR","Asked via Image"),'image':payload['image']}
+
+@main.route('/api/vision-ask', methods=['POST'])
 @login_required
 def vision_ask():
-    check_daily_reset(current_user)
-    if current_user.questions_today>=current_user.daily_limit:
-        return jsonify({'error':'Daily limit reached','limit_reached':True}),403
+    if quota_remaining(current_user)<=0:
+        return limit_reached()
     if 'image' not in request.files:
         return jsonify({'error':'No image uploaded'}),400
-    file=request.files['image']
-    image_data=base64.b64encode(file.read()).decode('utf-8')
     try:
-        completion=client.chat.completions.create(
-            model="llama-3.2-11b-vision-preview",
-            messages=[{"role":"user","content":[{"type":"text","text":"Solve the problem in this image."},{"type":"image_url","image_url":{"url":f"data:image/jpeg;base64,{image_data}"}}]}],
-            temperature=0.7
-        )
-        answer=completion.choices[0].message.content
-        current_user.questions_today+=1
-        current_user.total_questions_asked=(current_user.total_questions_asked or 0)+1
-        add_xp(current_user,15,subject="Image OCR",action="Asked via Image")
-        return jsonify({'answer':answer,'questions_left':current_user.daily_limit-current_user.questions_today})
-    except Exception as e:
-        return jsonify({'error':str(e)}),500
+        image_url,image_stats=prepare_image(request.files['image'])
+    except ImageRejected as e:
+        return jsonify({'error':str(e)}),400
+    if wants_job(request.form):
+        return enqueue_job('vision',{'image_url':image_url,'image':image_stats})
+    try:
+        answer=llm.complete(vision_messages(image_url),"llama-3.2-11b-vision-preview",temperature=0.7,**llm_options('vision',current_user.id))
+        questions_left=record_usage(current_user,15,subject="Image OCR",action="Asked via Image")
+        if questions_left is None:
+            return limit_reached()
+        return jsonify({'answer':answer,'questions_left':questions_left,'image':image_stats})
+    except LLMError as e:
+        return llm_error(e)
+    except Exception:
+        current_app.logger.exception("AI request failed")
+        return jsonify({'error':GENERIC_ERROR}),500
+
+# -------------------------
+# JOBS
+# -------------------------
+@main.route('/api/jobs/<id>')
+@login_required
+def get_job(id):
+    job=Job.query.filter_by(id=id,user_id=current_user.id).first()
+    if job is None:
+        return jsonify({'error':'Job not found'}),404
+    return jsonify(job_json(job))
+
+@main.route('/api/jobs/<id>/events')
+@login_required
+def job_events(id):
+    if Job.query.filter_by(id=id,user_id=current_user.id).first() is None:
+        return jsonify({'error':'Job not found'}),404
+    def generate():
+        status=None
+        deadline=time.monotonic()+JOB_EVENTS_TIMEOUT
+        while time.monotonic()<deadline:
+            job=db.session.get(Job,id,populate_existing=True)
+            if job.status!=status:
+                status=job.status
+                yield sse(job_json(job))
+                if status in ('succeeded','failed'):
+                    return
+            else:
+                yield ": keep-alive\n\n"
+            # End the read transaction so the next poll sees the worker's commit.
+            db.session.rollback()
+            time.sleep(0.5)
+    return event_stream(generate())
 
 # -------------------------
 # SUBMIT QUIZ SCORE
 # -------------------------
-@app.route('/api/submit-quiz-score',methods=['POST'])
+@main.route('/api/submit-quiz-score',methods=['POST'])
 @login_required
 def submit_quiz_score():
     data=request.json
@@ -356,22 +714,30 @@ def submit_quiz_score():
     new_score=QuizScore(topic=topic,score=score,total_questions=total,user_id=current_user.id)
     db.session.add(new_score)
     xp_reward=score*5
-    add_xp(current_user,xp_reward,subject=topic,action=f"Completed Quiz (Score: {score}/{total})")
+    record_usage(current_user,xp_reward,subject=topic,action=f"Completed Quiz (Score: {score}/{total})",consume_quota=False,quiz=(score,total))
     return jsonify({'success':True,'xp_earned':xp_reward,'new_xp':current_user.xp,'new_level':current_user.level})
 
 # -------------------------
 # LEADERBOARD
 # -------------------------
-@app.route('/api/leaderboard')
+@main.route('/api/leaderboard')
 @login_required
 def get_leaderboard():
-    top_users=User.query.order_by(User.xp.desc()).limit(5).all()
-    return jsonify([{'username':u.username,'xp':u.xp,'level':u.level} for u in top_users])
+    scope=request.args.get('scope')
+    limit=max(1,min(request.args.get('limit',5,type=int),100))
+    if scope=='class':
+        return jsonify(leaderboard.top(limit,student_class=current_user.student_class))
+    return jsonify(leaderboard.top(limit,weekly=scope=='weekly'))
+
+@main.route('/api/leaderboard/rank')
+@login_required
+def get_leaderboard_rank():
+    return jsonify(leaderboard.rank(current_user))
 
 # -------------------------
 # UPDATE CLASS
 # -------------------------
-@app.route('/api/update-class',methods=['POST'])
+@main.route('/api/update-class',methods=['POST'])
 @login_required
 def update_class():
     data=request.json
@@ -379,30 +745,35 @@ def update_class():
     if new_class:
         current_user.student_class=new_class
         db.session.commit()
+        leaderboard.record(current_user)
         return jsonify({'success':True,'new_class':new_class})
     return jsonify({'error':'No class provided'}),400
 
 # -------------------------
 # DOWNLOAD PDF
 # -------------------------
-@app.route('/api/download-pdf',methods=['POST'])
+@main.route('/api/download-pdf',methods=['POST'])
 @login_required
 def download_pdf():
     data=request.json
-    pdf=FPDF()
-    pdf.add_page()
-    pdf.set_font("Helvetica",size=12)
-    pdf.cell(200,10,txt=data.get('title','Study Note'),ln=True,align='C')
-    pdf.multi_cell(0,10,txt=data.get('content',''))
-    pdf_output=BytesIO()
-    pdf.output(pdf_output)
-    pdf_output.seek(0)
-    return send_file(pdf_output,as_attachment=True,download_name="study_doc.pdf",mimetype='application/pdf')
+    path,key=render_cache.pdf_path(data.get('title','Study Note'),data.get('content',''))
+    return send_file(path,as_attachment=True,download_name="study_doc.pdf",mimetype='application/pdf',etag=key,conditional=True)
 
 # -------------------------
 # NOTES CRUD
 # -------------------------
-@app.route('/notes',methods=['GET','POST'])
+# Characters of each note shown in the list; the full text is fetched on demand.
+NOTE_SNIPPET_CHARS = 300
+
+def notes_page(cursor,limit):
+    stmt=select(Note.id,Note.title,Note.created_at,func.substr(Note.content,1,NOTE_SNIPPET_CHARS).label('snippet')).where(Note.user_id==current_user.id)
+    return keyset_page(stmt,Note.created_at,Note.id,cursor,limit)
+
+def progress_page(cursor,limit):
+    stmt=select(QuizScore.id,QuizScore.topic,QuizScore.score,QuizScore.total_questions,QuizScore.timestamp).where(QuizScore.user_id==current_user.id)
+    return keyset_page(stmt,QuizScore.timestamp,QuizScore.id,cursor,limit)
+
+@main.route('/notes',methods=['GET','POST'])
 @login_required
 def notes():
     if request.method=='POST':
@@ -415,10 +786,16 @@ def notes():
             flash('Note saved!','success')
         else:
             flash('Title and Content are required','error')
-    user_notes=Note.query.filter_by(user_id=current_user.id).order_by(Note.created_at.desc()).all()
-    return render_template('notes.html',notes=user_notes)
+    query=request.args.get('q','').strip()
+    if query:
+        return render_template('notes.html',notes=notes_search.search(current_user.id,query),next_cursor=None,query=query)
+    try:
+        user_notes,next_cursor=notes_page(request.args.get('cursor'),page_size(request.args.get('limit')))
+    except ValueError:
+        user_notes,next_cursor=notes_page(None,page_size(None))
+    return render_template('notes.html',notes=user_notes,next_cursor=next_cursor)
 
-@app.route('/notes/delete/<int:id>')
+@main.route('/notes/delete/<int:id>')
 @login_required
 def delete_note(id):
     note=Note.query.get_or_404(id)
@@ -426,56 +803,153 @@ def delete_note(id):
         db.session.delete(note)
         db.session.commit()
         flash('Note deleted','success')
-    return redirect(url_for('notes'))
+    return redirect(url_for('.notes'))
 
 # -------------------------
 # ADS REWARD
 # -------------------------
-@app.route('/api/watch-ad',methods=['POST'])
+@main.route('/api/watch-ad',methods=['POST'])
 @login_required
 def watch_ad_reward():
-    current_user.daily_limit+=1
-    db.session.commit()
-    return jsonify({'success':True,'new_limit':current_user.daily_limit})
+    return jsonify({'success':True,'new_limit':raise_daily_limit(current_user)})
 
-@app.route('/ads.txt')
+@main.route('/ads.txt')
 def ads_txt():
     return send_from_directory('static', 'ads.txt')
 
 # -------------------------
 # TERMS / EXTRA ROUTES
 # -------------------------
-@app.route('/terms-of-use')
+@main.route('/terms-of-use')
 def terms_of_use():
     return render_template('terms_of_use.html')
 
-@app.route('/faq')
+@main.route('/faq')
+@page_cache.cached
 def faq():
     return render_template('faq.html')
 
-@app.route('/progress')
+@main.route('/progress')
 @login_required
 def progress():
-    scores = QuizScore.query.filter_by(user_id=current_user.id).order_by(QuizScore.created_at.desc()).all()
-    return render_template('progress.html', scores=scores)
+    try:
+        scores,next_cursor=progress_page(request.args.get('cursor'),page_size(request.args.get('limit')))
+    except ValueError:
+        scores,next_cursor=progress_page(None,page_size(None))
+    return render_template('progress.html', scores=scores, next_cursor=next_cursor, summary=daily_rollup.summary(current_user.id))
+
+# -------------------------
+# LIST APIS (infinite scroll)
+# -------------------------
+@main.route('/api/notes')
+@login_required
+def list_notes():
+    try:
+        rows,next_cursor=notes_page(request.args.get('cursor'),page_size(request.args.get('limit')))
+    except ValueError:
+        return jsonify({'error':'Invalid cursor'}),400
+    return jsonify({'notes':[{'id':r.id,'title':r.title,'snippet':r.snippet,'created_at':r.created_at.isoformat()} for r in rows],'next_cursor':next_cursor})
+
+@main.route('/api/notes/search')
+@login_required
+def search_notes():
+    # snippet is HTML: the note text is escaped and matches wrapped in <mark>.
+    results=notes_search.search(current_user.id,request.args.get('q',''),page_size(request.args.get('limit')))
+    return jsonify({'results':[{'id':r.id,'title':r.title,'snippet':str(r.snippet),'score':r.score,'created_at':r.created_at.isoformat()} for r in results]})
+
+@main.route('/api/notes/<int:id>')
+@login_required
+def get_note(id):
+    note=Note.query.filter_by(id=id,user_id=current_user.id).first()
+    if note is None:
+        return jsonify({'error':'Note not found'}),404
+    return jsonify({'id':note.id,'title':note.title,'content':note.content,'html':render_cache.html(note.content),'created_at':note.created_at.isoformat()})
+
+@main.route('/api/progress')
+@login_required
+def list_progress():
+    try:
+        rows,next_cursor=progress_page(request.args.get('cursor'),page_size(request.args.get('limit')))
+    except ValueError:
+        return jsonify({'error':'Invalid cursor'}),400
+    return jsonify({'scores':[{'id':r.id,'topic':r.topic,'score':r.score,'total':r.total_questions,'timestamp':r.timestamp.isoformat()} for r in rows],'next_cursor':next_cursor})
+
+# -------------------------
+# MONITORING
+# -------------------------
+@main.route('/metrics')
+def prometheus_metrics():
+    # Prometheus text format; set METRICS_TOKEN to require it as a bearer token.
+    token=current_app.config.get('METRICS_TOKEN')
+    if token and not hmac.compare_digest(request.headers.get('Authorization',''),f"Bearer {token}"):
+        return Response('Unauthorized\n',401,mimetype='text/plain')
+    return Response(metrics.render(),mimetype='text/plain; version=0.0.4; charset=utf-8')
 
 # -------------------------
 # ERROR HANDLERS
 # -------------------------
-@app.errorhandler(404)
+@main.app_errorhandler(404)
 def page_not_found(e):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@main.app_errorhandler(413)
+def request_too_large(e):
+    if request.path.startswith('/api/'):
+        return jsonify({'error':'The upload is too large'}),413
+    return e
+
+@main.app_errorhandler(LLMError)
+def llm_unavailable(e):
+    return llm_error(e)
+
+@main.app_errorhandler(PromptTooLarge)
+def prompt_too_large(e):
+    return jsonify({'error':str(e),'tokens':e.tokens,'limit':e.limit}),413
+
+@main.app_errorhandler(500)
 def internal_error(e):
+    if request.path.startswith('/api/'):
+        return jsonify({'error':GENERIC_ERROR}),500
     return render_template('500.html', error=str(e)), 500
 
 # -------------------------
-# RUN SERVER
+# CLI
 # -------------------------
-with app.app_context():
-    db.create_all()
+@main.cli.command('llm-usage')
+def llm_usage_command():
+    """Token and latency totals per AI route over the last 7 days."""
+    token_ledger.flush()
+    for row in token_ledger.summary():
+        print(f"{row['route']:<8} {row['calls']:>7} calls {row['prompt_tokens']:>10} prompt {row['completion_tokens']:>10} completion "
+              f"{row['avg_latency_ms']:>6} ms avg {row['max_latency_ms']:>6} ms max")
+
+@main.cli.command('warm-quizzes')
+@click.option('--topics', default=None, type=int, help='How many of the most requested topics to top up.')
+def warm_quizzes_command(topics):
+    """Top up the quiz bank for popular topics now, ignoring QUIZ_WARM_HOURS."""
+    print(f"{quiz_bank.warm(topics)} questions added")
+
+@main.cli.command('compact-activity')
+@click.option('--days', default=None, type=int, help='Keep raw activity rows this many days (default ACTIVITY_RETENTION_DAYS).')
+def compact_activity_command(days):
+    """Delete raw activity rows past retention; the daily rollups keep their totals."""
+    activity_log.flush()
+    print(f"{daily_rollup.compact(days)} activity rows deleted")
 
+@main.cli.command('init-db')
+def init_db_command():
+    """Create missing tables and the notes search index."""
+    init_schema()
+
+# -------------------------
+# RUN SERVER
+# -------------------------
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 10000))
+    app = create_app()
+    activity_log.start()
+    token_ledger.start()
+    daily_rollup.start()
+    job_queue.start()
+    leaderboard.start()
     app.run(host="0.0.0.0", port=port)
\ No newline at end of file
@@ -0,0 +1,173 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+FINGERPRINTED = ('.css', '.js', '.svg', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico', '.woff', '.woff2')
+PRECOMPRESSED = ('.css', '.js', '.svg')
+ONE_YEAR = 365 * 86400
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_SPACE = re.compile(r"\s+")
+# Spaces before ':' and around '+' stay: "a :hover" and calc(1px + 2px) need them.
+_CSS_PUNCT = re.compile(r" ?([{};,>]) ?|(:) ")
+_JS_LINE_COMMENT = re.compile(r"^//(?!#)")
+
+
+def minify_css(text):
+    text = _CSS_COMMENT.sub("", text)
+    text = _CSS_SPACE.sub(" ", text)
+    text = _CSS_PUNCT.sub(lambda m: m.group(1) or m.group(2), text)
+    return text.replace(";}", "}").strip()
+
+
+def minify_js(text):
+    # Line-based on purpose: indentation, blank lines and whole-line //
+    # comments go, line breaks stay so automatic semicolons still land
+    # where they did. Lines inside a template literal are left alone.
+    lines = []
+    in_template = False
+    for line in text.splitlines():
+        stripped = line.strip() if not in_template else line.rstrip()
+        if not in_template and (not stripped or _JS_LINE_COMMENT.match(stripped)):
+            continue
+        lines.append(stripped)
+        if (line.count("`") - line.count("\\`")) % 2:
+            in_template = not in_template
+    return "\n".join(lines) + "\n"
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class AssetPipeline:
+    """Fingerprinted, minified and precompressed copies of static files.
+
+    At startup every static file with a FINGERPRINTED extension is copied
+    to instance/assets as name.<hash>.ext, CSS and JS minified first, with
+    .gz and .br siblings for text types. url_for('static', filename=...)
+    then points at the hashed copy, which is served with a one-year
+    immutable Cache-Control, since a changed file gets a new URL. A
+    manifest.json keyed by the source hash lets later processes skip
+    unchanged files. Other static files are served as before.
+    """
+
+    def __init__(self, app=None):
+        self.root = None
+        self.manifest = {}       # logical name -> fingerprinted name
+        self._encodings = {}     # fingerprinted name -> available precompressed encodings
+        self._fallback = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.static_folder is None or str(app.config.get('ASSETS_FINGERPRINT', True)).lower() in ('0', 'false', 'no'):
+            return
+        self.source = app.static_folder
+        self.root = app.config.get('ASSETS_DIR') or os.path.join(app.instance_path, 'assets')
+        self.build()
+        app.url_defaults(self._url_defaults)
+        self._fallback = app.view_functions['static']
+        app.view_functions['static'] = self.serve
+
+    def build(self):
+        os.makedirs(self.root, exist_ok=True)
+        previous = self._load_manifest()
+        entries = {}
+        for dirpath, _, filenames in os.walk(self.source):
+            for filename in sorted(filenames):
+                ext = os.path.splitext(filename)[1]
+                if ext.lower() not in FINGERPRINTED:
+                    continue
+                path = os.path.join(dirpath, filename)
+                logical = os.path.relpath(path, self.source).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                source = _digest(data)
+                entry = previous.get(logical)
+                if not (entry and entry['source'] == source and os.path.exists(self._path(entry['name']))):
+                    entry = self._build_file(logical, data, source)
+                entries[logical] = entry
+        self._write('manifest.json', json.dumps(entries, indent=2, sort_keys=True).encode('utf-8'))
+        self.manifest = {logical: entry['name'] for logical, entry in entries.items()}
+        self._encodings = {entry['name']: tuple(entry['encodings']) for entry in entries.values()}
+        return self.manifest
+
+    def _build_file(self, logical, data, source):
+        stem, ext = os.path.splitext(logical)
+        minify = MINIFIERS.get(ext.lower())
+        if minify is not None:
+            try:
+                data = minify(data.decode('utf-8')).encode('utf-8')
+            except Exception:
+                log.exception("Could not minify %s, serving it as is", logical)
+        name = f"{stem}.{_digest(data)[:12]}{ext}"
+        self._write(name, data)
+        encodings = []
+        if ext.lower() in PRECOMPRESSED:
+            if brotli is not None:
+                self._write(f"{name}.br", brotli.compress(data, quality=11))
+                encodings.append('br')
+            self._write(f"{name}.gz", gzip.compress(data, 9, mtime=0))
+            encodings.append('gzip')
+        return {'source': source, 'name': name, 'encodings': encodings}
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static':
+            name = self.manifest.get(values.get('filename'))
+            if name is not None:
+                values['filename'] = name
+
+    def serve(self, filename):
+        encodings = self._encodings.get(filename)
+        if encodings is None:
+            return self._fallback(filename=filename)
+        encoding = next((e for e in encodings if request.accept_encodings[e]), None)
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+        # The hash in the name is the content hash, so it doubles as the ETag.
+        etag = filename.rsplit('.', 2)[-2] + (f"-{encoding}" if encoding else '')
+        response = send_file(self._path(filename + suffix), mimetype=mimetypes.guess_type(filename)[0],
+                             etag=etag, max_age=ONE_YEAR, conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def _load_manifest(self):
+        try:
+            with open(self._path('manifest.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def _write(self, name, data):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+assets = AssetPipeline()
@@ -0,0 +1,119 @@
+"""Notes search latency on a large corpus: FTS5 vs. LIKE.
+
+Seeds --notes notes spread over --users users. Words are drawn from a
+Zipf-distributed vocabulary of --vocabulary words with the study terms
+below among the common ones, like real notes. The script then builds the
+note_fts index and times one user's ranked search for single words,
+two-word queries and prefixes, against a LIKE scan of the same user's
+notes, newest first.
+
+    python benchmarks/bench_notes_search.py --notes 1000000
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+import database  # noqa: F401  registers the SQLite PRAGMAs
+from models import db, Note
+from search import notes_search
+
+WORDS = ("cell nucleus membrane mitochondria enzyme protein energy photosynthesis chlorophyll light "
+         "atom electron proton neutron molecule bond reaction acid base salt equation force mass "
+         "velocity acceleration gravity momentum wave frequency current voltage resistance circuit "
+         "algebra equation integral derivative matrix vector probability triangle circle theorem "
+         "history empire revolution treaty parliament economy trade climate river mountain").split()
+
+QUERIES = {
+    "word": lambda rnd: rnd.choice(WORDS),
+    "two_words": lambda rnd: f"{rnd.choice(WORDS)} {rnd.choice(WORDS)}",
+    "prefix": lambda rnd: rnd.choice(WORDS)[:4] + "*",
+}
+
+
+def vocabulary(size, rnd):
+    words = [f"{rnd.choice('bcdfghklmnprstvz')}{rnd.choice('aeiou')}{i:x}{rnd.choice('aeiou')}" for i in range(size)]
+    for word in WORDS:
+        words[rnd.randint(20, 2000)] = word
+    # Cumulative once; choices() would re-sum 50k weights on every call.
+    return words, list(itertools.accumulate(1 / rank for rank in range(1, size + 1)))
+
+
+def seed(path, notes, users, vocabulary_size):
+    conn = sqlite3.connect(path)
+    rnd = random.Random(42)
+    words, cum_weights = vocabulary(vocabulary_size, rnd)
+    conn.executemany("INSERT INTO user (id, username, email, password) VALUES (?, ?, ?, 'x')",
+                     ((i, f"user{i}", f"user{i}@example.com") for i in range(1, users + 1)))
+    conn.executemany("INSERT INTO note (title, content, created_at, user_id) VALUES (?, ?, datetime('2025-01-01', '+' || abs(random() % 300) || ' days'), ?)",
+                     ((" ".join(rnd.choices(words, cum_weights=cum_weights, k=3)).title(), " ".join(rnd.choices(words, cum_weights=cum_weights, k=80)), rnd.randint(1, users))
+                      for _ in range(notes)))
+    conn.commit()
+    conn.close()
+
+
+def like(user_id, query):
+    pattern = f"%{query.rstrip('*')}%"
+    return (Note.query.filter(Note.user_id == user_id)
+            .filter(Note.title.like(pattern) | Note.content.like(pattern))
+            .order_by(Note.created_at.desc()).limit(20).all())
+
+
+def time_search(search, samples, users):
+    rnd = random.Random(7)
+    results = {}
+    for name, make_query in QUERIES.items():
+        timings = []
+        for _ in range(samples):
+            user_id, query = rnd.randint(1, users), make_query(rnd)
+            start = time.perf_counter()
+            search(user_id, query)
+            timings.append((time.perf_counter() - start) * 1000)
+            db.session.remove()
+        timings.sort()
+        results[name] = {"p50_ms": round(statistics.median(timings), 3),
+                         "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--notes", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--samples", type=int, default=100)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        # Random-order index inserts are what make a 1M-row seed slow.
+        indexes = list(Note.__table__.indexes)
+        for index in indexes:
+            index.drop(db.engine)
+        seed(path, args.notes, args.users, args.vocabulary)
+        for index in indexes:
+            index.create(db.engine)
+        start = time.perf_counter()
+        notes_search.install()
+        report = {"notes": args.notes, "users": args.users, "index_build_s": round(time.perf_counter() - start, 1)}
+        report["like"] = time_search(like, args.samples, args.users)
+        report["fts5"] = time_search(notes_search.search, args.samples, args.users)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Hot query latency on a large SQLite database, with and without indexes.
+
+Seeds notes, quiz scores and activity log rows spread over --users users,
+times the /notes, /progress, analytics and /api/leaderboard query shapes
+with the models' indexes dropped, then again with them created.
+
+    python benchmarks/bench_queries.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+import database  # noqa: F401  registers the SQLite PRAGMAs
+from models import db, User, Note, ActivityLog, QuizScore
+
+QUERIES = {
+    "notes": lambda uid: Note.query.filter_by(user_id=uid).order_by(Note.created_at.desc()).all(),
+    "progress": lambda uid: QuizScore.query.filter_by(user_id=uid).order_by(QuizScore.timestamp.desc()).all(),
+    "activity": lambda uid: ActivityLog.query.filter_by(user_id=uid).order_by(ActivityLog.timestamp.desc()).limit(50).all(),
+    "leaderboard": lambda uid: User.query.order_by(User.xp.desc()).limit(5).all(),
+}
+
+
+def seed(path, rows, users):
+    conn = sqlite3.connect(path)
+    rnd = random.Random(42)
+    start = datetime(2025, 1, 1)
+    conn.executemany("INSERT INTO user (id, username, email, password, xp, level, daily_limit, questions_today) VALUES (?, ?, ?, ?, ?, 1, 5, 0)",
+                     ((i, f"user{i}", f"user{i}@example.com", "x", rnd.randint(0, 50000)) for i in range(1, users + 1)))
+
+    def stamps():
+        return start + timedelta(seconds=rnd.randint(0, 300 * 86400))
+
+    conn.executemany("INSERT INTO note (title, content, created_at, user_id) VALUES (?, ?, ?, ?)",
+                     ((f"Note {i}", "Photosynthesis converts light energy into chemical energy. " * 4, stamps(), rnd.randint(1, users)) for i in range(rows)))
+    conn.executemany("INSERT INTO activity_log (subject, action, timestamp, user_id) VALUES (?, ?, ?, ?)",
+                     (("Science", "Asked Question", stamps(), rnd.randint(1, users)) for _ in range(rows)))
+    conn.executemany("INSERT INTO quiz_score (topic, score, total_questions, timestamp, user_id) VALUES (?, ?, 5, ?, ?)",
+                     (("Chapter 3", rnd.randint(0, 5), stamps(), rnd.randint(1, users)) for _ in range(rows // 10)))
+    conn.commit()
+    conn.close()
+
+
+def time_queries(samples, users):
+    rnd = random.Random(7)
+    results = {}
+    for name, query in QUERIES.items():
+        timings = []
+        for _ in range(samples):
+            uid = rnd.randint(1, users)
+            start = time.perf_counter()
+            query(uid)
+            timings.append((time.perf_counter() - start) * 1000)
+            db.session.remove()
+        results[name] = {"p50_ms": round(statistics.median(timings), 3), "max_ms": round(max(timings), 3)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--samples", type=int, default=30)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+        for index in indexes:
+            index.drop(db.engine)
+        seed(path, args.rows, args.users)
+        report = {"rows": args.rows, "users": args.users, "without_indexes": time_queries(args.samples, args.users)}
+        for index in indexes:
+            index.create(db.engine)
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql("ANALYZE")
+        report["with_indexes"] = time_queries(args.samples, args.users)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
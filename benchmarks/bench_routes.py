@@ -0,0 +1,215 @@
+"""End-to-end route latency with an in-process fake LLM.
+
+Boots app against a fresh SQLite database seeded with --users users and
+their notes, quiz scores and activity, with LLM_BACKEND=fake standing in
+for Groq (--latency seconds per completion, --tokens tokens each). Then,
+one route at a time, --concurrency logged-in clients send --requests
+requests between them through Flask's test client, and the script
+reports p50/p95/p99 latency, throughput and SQL statements per request.
+
+Results are written to --output as JSON, tagged with the git commit.
+Pass an earlier file as --baseline to print the p95 change per route.
+
+    python benchmarks/bench_routes.py --output before.json
+    python benchmarks/bench_routes.py --baseline before.json
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SUBJECTS = ["Science", "Maths", "History", "Geography", "Physics", "Chemistry", "Biology"]
+TOPICS = ["photosynthesis", "fractions", "french revolution", "plate tectonics", "newton's laws",
+          "chemical bonding", "cell division", "quadratic equations", "the water cycle", "electricity"]
+
+ROUTES = {
+    "ask": lambda c, rnd, ctx: c.post("/api/ask", json={"question": f"Explain {rnd.choice(TOPICS)} ({rnd.randrange(ctx['distinct'])})",
+                                                         "subject": rnd.choice(SUBJECTS)}),
+    "generate_quiz": lambda c, rnd, ctx: c.post("/api/generate-quiz", json={"topic": f"{rnd.choice(TOPICS)} {rnd.randrange(ctx['distinct'])}",
+                                                                             "subject": rnd.choice(SUBJECTS)}),
+    "pdf_chat": lambda c, rnd, ctx: c.post("/api/pdf-chat", json={"document_id": ctx["documents"][id(c)],
+                                                                   "question": f"What does it say about {rnd.choice(TOPICS)}?"}),
+    "leaderboard": lambda c, rnd, ctx: c.get("/api/leaderboard"),
+    "notes": lambda c, rnd, ctx: c.get("/notes"),
+    "dashboard": lambda c, rnd, ctx: c.get("/dashboard"),
+    "blog_post": lambda c, rnd, ctx: c.get(f"/blog/{rnd.choice(ctx['slugs'])}"),
+}
+
+
+def seed(path, users, notes_per_user, password):
+    conn = sqlite3.connect(path)
+    rnd = random.Random(42)
+    start = datetime.utcnow() - timedelta(days=300)
+
+    def stamp():
+        return start + timedelta(seconds=rnd.randint(0, 300 * 86400))
+
+    # Quota far above what a run can spend, already reset for today.
+    conn.executemany("INSERT INTO user (id, username, email, password, student_class, xp, level, daily_limit, questions_today, "
+                     "last_active_date, account_created_at, total_questions_asked) VALUES (?, ?, ?, ?, 'Class 10', ?, 1, 1000000000, 0, ?, ?, 0)",
+                     ((i, f"bench{i}", f"bench{i}@example.com", password, rnd.randint(0, 50000), date.today().isoformat(), stamp())
+                      for i in range(1, users + 1)))
+    conn.executemany("INSERT INTO note (title, content, created_at, user_id) VALUES (?, ?, ?, ?)",
+                     ((f"{rnd.choice(TOPICS).title()} notes", f"# {rnd.choice(TOPICS)}\n\n" + "Key idea explained in detail. " * 60, stamp(), uid)
+                      for uid in range(1, users + 1) for _ in range(notes_per_user)))
+    conn.executemany("INSERT INTO quiz_score (topic, score, total_questions, timestamp, user_id) VALUES (?, ?, 5, ?, ?)",
+                     ((rnd.choice(TOPICS), rnd.randint(0, 5), stamp(), uid) for uid in range(1, users + 1) for _ in range(notes_per_user // 2)))
+    conn.executemany("INSERT INTO activity_log (subject, action, timestamp, user_id) VALUES (?, 'Asked Question', ?, ?)",
+                     ((rnd.choice(SUBJECTS), stamp(), uid) for uid in range(1, users + 1) for _ in range(notes_per_user * 2)))
+    conn.commit()
+    conn.close()
+
+
+def sample_pdf():
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.set_font("Helvetica", size=10)
+    for topic in TOPICS:
+        pdf.add_page()
+        pdf.multi_cell(0, 5, text=f"{topic}. " * 150)
+    return bytes(pdf.output())
+
+
+class QueryCounter:
+    """SQL statements issued by the current thread, i.e. by its request."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self._local = threading.local()
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self._local.count = getattr(self._local, "count", 0) + 1
+
+    def take(self):
+        count, self._local.count = getattr(self._local, "count", 0), 0
+        return count
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_route(name, clients, requests, ctx, counter):
+    send = ROUTES[name]
+    per_client = max(1, requests // len(clients))
+
+    def worker(n):
+        rnd = random.Random(f"{name}:{n}")
+        client = clients[n]
+        send(client, rnd, ctx)  # warm-up, not timed
+        counter.take()
+        timings, queries, errors = [], [], 0
+        for _ in range(per_client):
+            start = time.perf_counter()
+            response = send(client, rnd, ctx)
+            response.get_data()
+            timings.append((time.perf_counter() - start) * 1000)
+            queries.append(counter.take())
+            errors += response.status_code >= 400
+        return timings, queries, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(len(clients)) as pool:
+        results = list(pool.map(worker, range(len(clients))))
+    elapsed = time.perf_counter() - start
+    timings = sorted(t for r in results for t in r[0])
+    queries = [q for r in results for q in r[1]]
+    return {
+        "requests": len(timings),
+        "errors": sum(r[2] for r in results),
+        "throughput_rps": round(len(timings) / elapsed, 1),
+        "p50_ms": round(percentile(timings, 0.50), 2),
+        "p95_ms": round(percentile(timings, 0.95), 2),
+        "p99_ms": round(percentile(timings, 0.99), 2),
+        "queries_per_request": round(statistics.mean(queries), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--notes-per-user", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=400, help="requests per route")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM seconds per completion")
+    parser.add_argument("--tokens", type=int, default=200, help="fake LLM tokens per completion")
+    parser.add_argument("--distinct", type=int, default=1000, help="distinct prompts per route; lower means more cache hits")
+    parser.add_argument("--route", action="append", dest="routes", choices=sorted(ROUTES))
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", f"routes-{git_commit() or 'local'}.json"))
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}", LLM_BACKEND="fake",
+                      LLM_FAKE_LATENCY=str(args.latency), LLM_FAKE_TOKENS=str(args.tokens),
+                      LLM_FLIGHT_DIR=os.path.join(workdir, "flights"))
+
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from blog_data import blog_posts
+    from models import db
+
+    app = create_app()
+    seed(os.path.join(workdir, "bench.db"), args.users, args.notes_per_user, generate_password_hash("bench"))
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+
+    clients, documents = [], {}
+    pdf = sample_pdf()
+    for n in range(1, args.concurrency + 1):
+        client = app.test_client()
+        client.post("/login", data={"username": f"bench{n}", "password": "bench"})
+        upload = client.post("/api/documents", data={"pdf": (io.BytesIO(pdf), "bench.pdf")}, content_type="multipart/form-data")
+        documents[id(client)] = upload.get_json()["document_id"]
+        clients.append(client)
+    deadline = time.time() + 60
+    while any(c.get(f"/api/documents/{documents[id(c)]}").get_json()["status"] == "processing" for c in clients):
+        if time.time() > deadline:
+            raise RuntimeError("benchmark PDFs were not indexed")
+        time.sleep(0.2)
+
+    ctx = {"documents": documents, "slugs": list(blog_posts), "distinct": args.distinct}
+    report = {
+        "commit": git_commit(),
+        "date": datetime.utcnow().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "routes": {name: run_route(name, clients, args.requests, ctx, counter) for name in (args.routes or ROUTES)},
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["routes"], indent=2))
+    print(f"saved {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["routes"]
+        for name, result in report["routes"].items():
+            if name in baseline:
+                before, after = baseline[name]["p95_ms"], result["p95_ms"]
+                print(f"{name:<14} p95 {before:>9.2f} -> {after:>9.2f} ms ({(after - before) / before * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
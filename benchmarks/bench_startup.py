@@ -0,0 +1,76 @@
+"""Worker startup cost: importing app and calling create_app().
+
+Each run is a fresh interpreter, like a gunicorn worker boot. Reports the
+median wall time of `import app` and of create_app(), which heavy modules
+were left unloaded for first use, and the slowest imports by cumulative
+time as measured by python -X importtime.
+
+    python benchmarks/bench_startup.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFERRED = ["groq", "fpdf", "pypdf", "alembic", "flask_migrate", "blog_data"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "create_app_ms": (created - imported) * 1000,
+                  "loaded": [m for m in %r if type(sys.modules.get(m)).__name__ == "module"]}))
+""" % (DEFERRED,)
+
+
+def probe(env, importtime=False):
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", PROBE]
+    result = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, top):
+    # Lines look like "import time: self [us] | cumulative | name" with two
+    # more spaces of indent per nesting level; keep what app imports directly.
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if len(name) - len(name.lstrip()) == 3:
+            rows.append((int(cumulative) / 1000, name.strip()))
+    return [{"module": name, "cumulative_ms": round(ms, 1)} for ms, name in sorted(rows, reverse=True)[:top]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+               LLM_FLIGHT_DIR=os.path.join(workdir, "flights"), PYTHONDONTWRITEBYTECODE="")
+    probe(env)  # creates the schema and warms the bytecode cache
+    runs = [probe(env)[0] for _ in range(args.runs)]
+    profiled, stderr = probe(env, importtime=True)
+    report = {
+        "runs": args.runs,
+        "import_ms": round(statistics.median(r["import_ms"] for r in runs), 1),
+        "create_app_ms": round(statistics.median(r["create_app_ms"] for r in runs), 1),
+        "deferred": [m for m in DEFERRED if m not in profiled["loaded"]],
+        "slowest_imports": slowest_imports(stderr, args.top),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Commits and wall time per AI request for quota/XP accounting.
+
+Compares the old sequence (check_daily_reset commit, then add_xp's
+ActivityLog insert + commit) with usage.record_usage on a file-backed
+SQLite database.
+
+    python benchmarks/bench_usage_commits.py --requests 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, User, ActivityLog
+from usage import DEFAULT_DAILY_LIMIT, record_usage
+
+
+def legacy_request(user):
+    # app.py before user-005: check_daily_reset, counter bumps, add_xp.
+    if user.last_active_date != date.today():
+        user.questions_today = 0
+        user.daily_limit = 5
+        user.last_active_date = date.today()
+        db.session.commit()
+    user.questions_today += 1
+    user.total_questions_asked = (user.total_questions_asked or 0) + 1
+    user.xp = (user.xp or 0) + 10
+    new_level = (user.xp // 100) + 1
+    if new_level > (user.level or 1):
+        user.level = new_level
+        user.daily_limit += 1
+    db.session.add(ActivityLog(subject="Maths", action="Asked Question", user_id=user.id))
+    db.session.commit()
+
+
+def fresh_user(label, n):
+    # Last active yesterday, so each user's first request also pays the reset.
+    user = User(username=f"{label}{n}", email=f"{label}{n}@example.com", password="x",
+                last_active_date=date.today() - timedelta(days=1))
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def measure(label, fn, requests, commits):
+    # One user per full day's quota, like a real day of traffic.
+    user_ids = [fresh_user(label, n).id for n in range(requests // DEFAULT_DAILY_LIMIT)]
+    db.session.remove()
+    commits.clear()
+    start = time.perf_counter()
+    for user_id in user_ids:
+        for _ in range(DEFAULT_DAILY_LIMIT):
+            # Each request gets a fresh session and loads its user, as in Flask.
+            fn(db.session.get(User, user_id))
+            db.session.remove()
+    elapsed = time.perf_counter() - start
+    total = len(user_ids) * DEFAULT_DAILY_LIMIT
+    return {"path": label, "requests": total, "commits_per_request": round(len(commits) / total, 3),
+            "ms_per_request": round(elapsed * 1000 / total, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        commits = []
+        event.listen(db.engine, "commit", lambda conn: commits.append(1))
+        print(measure("legacy", legacy_request, args.requests, commits))
+        print(measure("record_usage", lambda u: record_usage(u, 10, subject="Maths", action="Asked Question"), args.requests, commits))
+
+
+if __name__ == "__main__":
+    main()
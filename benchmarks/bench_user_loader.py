@@ -0,0 +1,59 @@
+"""Requests per second and SQL statements per request on authenticated
+polling routes, with the user_loader cache off (USER_CACHE_TTL=0) and on.
+
+    python benchmarks/bench_user_loader.py --requests 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from sqlalchemy import event
+
+import app as app_module
+from models import db
+from usercache import user_cache
+
+ROUTES = ["/dashboard", "/api/leaderboard"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = app_module.create_app()
+    client = app.test_client()
+    client.post("/register", data={"username": "bench", "email": "bench@example.com",
+                                   "password": "bench", "student_class": "Class 10"})
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(1))
+
+    results = []
+    for ttl in (0, 5):
+        user_cache.ttl = ttl
+        user_cache.clear()
+        for route in ROUTES:
+            client.get(route)  # warm templates, leaderboard and the cache
+            statements.clear()
+            start = time.perf_counter()
+            for _ in range(args.requests):
+                client.get(route)
+            elapsed = time.perf_counter() - start
+            results.append({"user_cache_ttl": ttl, "route": route,
+                            "rps": round(args.requests / elapsed, 1),
+                            "sql_per_request": round(len(statements) / args.requests, 2)})
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Concurrency load test for the gunicorn worker modes.
+
+Boots a fake Groq-compatible upstream that answers after a fixed delay,
+then runs the real app under gunicorn once per worker class and fires
+concurrent /api/ask requests at it. With sync workers throughput is capped
+at workers / latency; with gevent it scales with the number of clients.
+Each client asks a different question, so the response cache and request
+coalescing don't answer for the upstream.
+
+    python benchmarks/load_test.py --clients 100 --latency 1.0
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def fake_groq(latency):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            body = json.dumps({
+                "id": "fake", "object": "chat.completion", "created": 0, "model": "fake",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "Fake answer."}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def wait_for(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1)
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def client_session(base, n):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    form = urllib.parse.urlencode({"username": f"load{n}", "email": f"load{n}@example.com",
+                                   "password": "load", "student_class": "Class 10"}).encode()
+    opener.open(f"{base}/register", form)
+    return opener
+
+
+def ask(opener, base, n):
+    question = f"What is photosynthesis? (load client {n})"
+    req = urllib.request.Request(f"{base}/api/ask", method="POST",
+                                 data=json.dumps({"question": question, "subject": "Science"}).encode(),
+                                 headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    opener.open(req, timeout=300).read()
+    return time.perf_counter() - start
+
+
+def run(worker_class, args, upstream):
+    workdir = tempfile.mkdtemp()
+    port = free_port()
+    env = dict(os.environ, GROQ_API_KEY="load-test", GROQ_BASE_URL=f"http://127.0.0.1:{upstream.server_port}",
+               PORT=str(port), WEB_CONCURRENCY=str(args.workers), GUNICORN_WORKER_CLASS=worker_class,
+               RESPONSE_CACHE_SIMILARITY="0")
+    # Copy the tree so the run gets its own instance/database.db.
+    app_dir = os.path.join(workdir, "app")
+    shutil.copytree(ROOT, app_dir, ignore=shutil.ignore_patterns("instance", ".git", "__pycache__"))
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "app:create_app()", "-c", "gunicorn.conf.py"],
+                            cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        wait_for(f"{base}/robots.txt")
+        with ThreadPoolExecutor(args.clients) as pool:
+            openers = list(pool.map(lambda n: client_session(base, n), range(args.clients)))
+            start = time.perf_counter()
+            latencies = sorted(pool.map(lambda n: ask(openers[n], base, n), range(args.clients)))
+            elapsed = time.perf_counter() - start
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "worker_class": worker_class,
+        "requests": len(latencies),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_s": round(latencies[len(latencies) // 2], 2),
+        "max_s": round(latencies[-1], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake upstream latency in seconds")
+    parser.add_argument("--worker-class", action="append", dest="worker_classes")
+    args = parser.parse_args()
+
+    upstream = fake_groq(args.latency)
+    results = [run(wc, args, upstream) for wc in (args.worker_classes or ["sync", "gevent"])]
+    for r in results:
+        print(json.dumps(r))
+    if len(results) > 1:
+        print(f"concurrency gain: {results[-1]['throughput_rps'] / results[0]['throughput_rps']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import math
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from activity import BufferedWriter
+from models import db, LLMUsage
+
+# Roughly what Llama's tokenizer produces for English prose and code.
+CHARS_PER_TOKEN = 4
+# Per-message framing tokens added by the chat template.
+MESSAGE_OVERHEAD = 4
+# Llama 3.2 Vision encodes every image as a fixed number of tokens.
+IMAGE_TOKENS = 1601
+
+# input: longest user-supplied text; context: retrieved text sent along
+# with it (trimmed, not rejected); completion: max_tokens for the reply.
+Budget = namedtuple('Budget', 'input context completion')
+
+
+def _budget(route, input, context, completion):
+    prefix = f"TOKEN_BUDGET_{route.upper()}_"
+    return Budget(
+        int(os.environ.get(prefix + "INPUT", input)),
+        int(os.environ.get(prefix + "CONTEXT", context)),
+        int(os.environ.get(prefix + "COMPLETION", completion)),
+    )
+
+
+BUDGETS = {
+    'ask': _budget('ask', 1000, 0, 1024),
+    'notes': _budget('notes', 200, 0, 2048),
+    'quiz': _budget('quiz', 200, 0, 1024),
+    'pdf': _budget('pdf', 500, 3000, 1024),
+    'vision': _budget('vision', 0, 0, 1024),
+}
+
+
+class PromptTooLarge(ValueError):
+    def __init__(self, field, tokens, limit):
+        super().__init__(f"The {field} is too long (about {tokens} tokens; the limit is {limit}). Please shorten it.")
+        self.tokens = tokens
+        self.limit = limit
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def message_tokens(messages):
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            for part in content:
+                total += IMAGE_TOKENS if part.get("type") == "image_url" else estimate_tokens(part.get("text"))
+        else:
+            total += estimate_tokens(content)
+        total += MESSAGE_OVERHEAD
+    return total
+
+
+def check_input(route, field, text):
+    limit = BUDGETS[route].input
+    tokens = estimate_tokens(text)
+    if tokens > limit:
+        raise PromptTooLarge(field, tokens, limit)
+    return text
+
+
+def fit_context(route, text):
+    # Cut at a word boundary once the context budget is spent; search()
+    # returns chunks best match first, so the lowest-ranked are dropped.
+    limit = BUDGETS[route].context * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0]
+
+
+def completion_limit(route):
+    return BUDGETS[route].completion
+
+
+class TokenLedger(BufferedWriter):
+    """Per-call prompt/completion tokens and latency, written to llm_usage
+    in batches off the request path."""
+
+    def __init__(self, app=None, **kwargs):
+        super().__init__(LLMUsage, "LLM_USAGE_BUFFERED", app, **kwargs)
+
+    def record(self, route, user_id, model, prompt_tokens, completion_tokens, latency_ms, estimated=False):
+        self.add({
+            "route": route or "other", "user_id": user_id, "model": model,
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "latency_ms": int(latency_ms), "estimated": estimated, "timestamp": datetime.utcnow(),
+        })
+
+    def summary(self, days=7):
+        since = datetime.utcnow() - timedelta(days=days)
+        rows = db.session.execute(
+            db.select(
+                LLMUsage.route,
+                func.count(),
+                func.sum(LLMUsage.prompt_tokens),
+                func.sum(LLMUsage.completion_tokens),
+                func.avg(LLMUsage.latency_ms),
+                func.max(LLMUsage.latency_ms),
+            )
+            .where(LLMUsage.timestamp >= since)
+            .group_by(LLMUsage.route)
+            .order_by(func.sum(LLMUsage.prompt_tokens + LLMUsage.completion_tokens).desc())
+        ).all()
+        return [
+            {'route': route, 'calls': calls, 'prompt_tokens': prompt or 0, 'completion_tokens': completion or 0,
+             'avg_latency_ms': round(avg or 0), 'max_latency_ms': peak or 0}
+            for route, calls, prompt, completion, avg, peak in rows
+        ]
+
+
+token_ledger = TokenLedger()
@@ -0,0 +1,112 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(text):
+    text = _PUNCT.sub(" ", str(text or "").lower())
+    return _SPACE.sub(" ", text).strip()
+
+
+def cache_scope(route, subject, student_class, model, template):
+    # Everything except the free-text question/topic. Only entries that share
+    # a scope are ever compared, so a Class 10 answer never serves Class 6.
+    template_hash = hashlib.sha1(template.encode("utf-8")).hexdigest()[:12]
+    return (route, normalize(subject), normalize(student_class), model, template_hash)
+
+
+def _ngrams(text, n=3):
+    padded = f" {text} "
+    return frozenset(padded[i:i + n] for i in range(max(len(padded) - n + 1, 1)))
+
+
+class ResponseCache:
+    """In-process LLM response cache.
+
+    Exact tier: normalized (scope, text) lookups in an LRU dict.
+    Similarity tier (similarity > 0): on an exact miss, the best entry in the
+    same scope whose character-trigram Jaccard score reaches the threshold.
+    """
+
+    def __init__(self, maxsize=2048, ttl=6 * 3600, similarity=0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # (scope, text) -> (expires_at, grams, value)
+        self._scopes = {}               # scope -> set of texts, for the similarity scan
+        self._lock = threading.Lock()
+
+    def get(self, scope, text):
+        text = normalize(text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((scope, text))
+            if entry and entry[0] > now:
+                self._entries.move_to_end((scope, text))
+                self.hits += 1
+                return entry[2]
+            if entry:
+                self._evict((scope, text))
+            if self.similarity > 0:
+                match = self._most_similar(scope, text, now)
+                if match is not None:
+                    self._entries.move_to_end((scope, match))
+                    self.similar_hits += 1
+                    return self._entries[(scope, match)][2]
+            self.misses += 1
+            return None
+
+    def set(self, scope, text, value):
+        text = normalize(text)
+        grams = _ngrams(text) if self.similarity > 0 else None
+        with self._lock:
+            self._entries[(scope, text)] = (time.monotonic() + self.ttl, grams, value)
+            self._entries.move_to_end((scope, text))
+            self._scopes.setdefault(scope, set()).add(text)
+            while len(self._entries) > self.maxsize:
+                self._evict(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.similar_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.similar_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    def _evict(self, key):
+        self._entries.pop(key, None)
+        texts = self._scopes.get(key[0])
+        if texts is not None:
+            texts.discard(key[1])
+            if not texts:
+                del self._scopes[key[0]]
+
+    def _most_similar(self, scope, text, now):
+        grams = _ngrams(text)
+        best, best_score = None, self.similarity
+        for candidate in list(self._scopes.get(scope, ())):
+            expires_at, candidate_grams, _ = self._entries[(scope, candidate)]
+            if expires_at <= now:
+                self._evict((scope, candidate))
+                continue
+            score = len(grams & candidate_grams) / len(grams | candidate_grams)
+            if score >= best_score:
+                best, best_score = candidate, score
+        return best
@@ -0,0 +1,45 @@
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# WAL lets readers run alongside the single writer, synchronous=NORMAL
+# drops the fsync on every commit (still durable at checkpoints in WAL
+# mode) and busy_timeout makes concurrent gunicorn workers wait for the
+# write lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "cache_size": -20000,
+    "temp_store": "MEMORY",
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+
+@event.listens_for(Engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def configure_database(app):
+    uri = os.environ.get("DATABASE_URL", "sqlite:///database.db")
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    options = {
+        'pool_size': int(os.environ.get("DB_POOL_SIZE", 5)),
+        'max_overflow': int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+        'pool_pre_ping': True,
+        'pool_recycle': 3600,
+    }
+    if uri.startswith('sqlite'):
+        # Pooled connections are handed between threads (the activity log
+        # writer, gevent greenlets); busy waits are handled by the PRAGMA.
+        options['connect_args'] = {'check_same_thread': False, 'timeout': 30}
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
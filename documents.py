@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from forksafe import per_process
+from models import db, Document
+from pdf_index import BM25Index, content_hash, iter_chunks, iter_pages, pdf_indexes
+
+log = logging.getLogger(__name__)
+
+
+class DocumentStore:
+    """Upload-once storage for PDFs used by /api/pdf-chat.
+
+    Files are stored once per content hash under instance/documents. A
+    background pool extracts their text once into <sha256>.json, and
+    follow-up questions rebuild the BM25 index from that text (or reuse the
+    in-memory one) instead of receiving and parsing the PDF again.
+    """
+
+    def __init__(self, app=None, max_workers=2, max_pages=1000):
+        self.max_workers = max_workers
+        self.max_pages = max_pages
+        self.app = None
+        self.root = None
+        self._pool = per_process(lambda: ThreadPoolExecutor(self.max_workers, thread_name_prefix='document-extract'))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.root = app.config.get('DOCUMENT_STORE_DIR') or os.path.join(app.instance_path, 'documents')
+        os.makedirs(self.root, exist_ok=True)
+
+    def save(self, file, user):
+        digest = content_hash(file.stream)
+        doc = Document.query.filter_by(user_id=user.id, sha256=digest).first()
+        if doc is not None and doc.status != 'failed':
+            return doc
+        if not os.path.exists(self._path(digest, 'pdf')):
+            tmp = self._path(digest, f'pdf.{os.getpid()}.tmp')
+            file.save(tmp)
+            os.replace(tmp, self._path(digest, 'pdf'))
+        if doc is None:
+            doc = Document(sha256=digest, filename=file.filename, user_id=user.id)
+            db.session.add(doc)
+        pages = self._read_text(digest)
+        if pages is not None:
+            doc.status, doc.page_count, doc.error = 'ready', len(pages), None
+        else:
+            doc.status, doc.error = 'processing', None
+        db.session.commit()
+        if doc.status == 'processing':
+            self._pool().submit(self._extract, doc.id)
+        return doc
+
+    def index(self, doc):
+        index = pdf_indexes.get(doc.sha256)
+        if index is None:
+            index = BM25Index(iter_chunks(self._read_text(doc.sha256) or []))
+            pdf_indexes.put(doc.sha256, index)
+        return index
+
+    def _extract(self, doc_id):
+        with self.app.app_context():
+            doc = db.session.get(Document, doc_id)
+            if doc is None:
+                return
+            try:
+                with open(self._path(doc.sha256, 'pdf'), 'rb') as f:
+                    pages = list(iter_pages(f, self.max_pages))
+                tmp = self._path(doc.sha256, f'json.{os.getpid()}.tmp')
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(pages, f)
+                os.replace(tmp, self._path(doc.sha256, 'json'))
+                pdf_indexes.put(doc.sha256, BM25Index(iter_chunks(pages)))
+                doc.status, doc.page_count = 'ready', len(pages)
+            except Exception as e:
+                log.exception("Text extraction failed for document %s", doc_id)
+                doc.status, doc.error = 'failed', str(e)[:255]
+            db.session.commit()
+
+    def _read_text(self, digest):
+        try:
+            with open(self._path(digest, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _path(self, digest, suffix):
+        return os.path.join(self.root, f"{digest}.{suffix}")
+
+
+document_store = DocumentStore()
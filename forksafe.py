@@ -0,0 +1,30 @@
+import os
+import threading
+
+
+class per_process:
+    """Build something once per process, on first call.
+
+    Threads and executors don't survive fork, so anything started before
+    gunicorn forks its workers (or by the master) is gone in the children.
+    Calling the wrapper runs start() the first time in each process and
+    returns what it built; later calls in the same process return that.
+    """
+
+    def __init__(self, start):
+        self._start = start
+        self._pid = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._value = self._start()
+                    self._pid = os.getpid()
+        return self._value
+
+    def current(self):
+        """What this process built, or None if nothing was started here yet."""
+        return self._value if self._pid == os.getpid() else None
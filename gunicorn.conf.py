@@ -0,0 +1,29 @@
+import os
+
+# Each AI route spends most of its time waiting on Groq. Cooperative gevent
+# workers yield on that socket I/O, so one process can hold hundreds of
+# in-flight requests instead of one. Set GUNICORN_WORKER_CLASS=sync to go
+# back to the classic pre-fork model.
+bind = f"0.0.0.0:{os.environ.get('PORT', '10000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 500))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+keepalive = 5
+
+
+def post_worker_init(worker):
+    # Background threads start here, once the app is loaded in the worker.
+    # Job workers would otherwise wait for the first enqueue, leaving jobs
+    # queued before a restart stuck, and the buffered writers would start
+    # inside the first request's write transaction (see BufferedWriter.start).
+    from activity import activity_log
+    from budget import token_ledger
+    from jobs import job_queue
+    from leaderboard import leaderboard
+    from rollups import daily_rollup
+    activity_log.start()
+    token_ledger.start()
+    daily_rollup.start()
+    job_queue.start()
+    leaderboard.start()
@@ -0,0 +1,181 @@
+import json
+import logging
+import random
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, select, update
+
+from forksafe import per_process
+from models import db, Job, User
+
+log = logging.getLogger(__name__)
+
+FAILED_MESSAGE = "Something went wrong. Please try again."
+
+
+class RetryJob(Exception):
+    """Raised by a handler to run the job again after a backoff."""
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail the job with a user-facing message."""
+
+
+class JobQueue:
+    """SQLite-backed job queue with an in-process worker pool.
+
+    Jobs are rows in the job table. Workers claim one with a single
+    UPDATE ... WHERE id = (SELECT ...) RETURNING, so two workers (or two
+    gunicorn processes) never run the same job. A job left 'running' past
+    lease seconds, e.g. by a killed worker, is claimed again. RetryJob and
+    the exceptions in retry_on are retried with jittered exponential
+    backoff up to max_attempts. Handlers charge quota themselves, only
+    after their work succeeded. Job.error is shown to users, so it only
+    carries the message of JobFailed, RetryJob and the exceptions in
+    public_errors; anything else is logged and stored as FAILED_MESSAGE.
+    """
+
+    def __init__(self, app=None, workers=2, max_attempts=4, backoff=2.0, lease=300, poll_interval=0.5):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.retry_on = ()
+        self.public_errors = ()
+        self.app = None
+        self._handlers = {}
+        self._wake = threading.Event()
+        self._workers = per_process(self._start_workers)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = int(app.config.get('JOB_WORKERS', self.workers))
+
+    def handler(self, kind):
+        def register(fn):
+            self._handlers[kind] = fn
+            return fn
+        return register
+
+    def enqueue(self, kind, user_id, payload):
+        now = datetime.utcnow()
+        job = Job(id=uuid.uuid4().hex, kind=kind, payload=json.dumps(payload), user_id=user_id,
+                  status='queued', attempts=0, run_after=now, created_at=now, updated_at=now)
+        db.session.add(job)
+        db.session.commit()
+        self._ensure_workers()
+        self._wake.set()
+        return job
+
+    def start(self):
+        """Start this process's workers now, so jobs left queued or running
+        by a previous process are picked up without waiting for an enqueue."""
+        if self.app is not None:
+            self._ensure_workers()
+
+    def _ensure_workers(self):
+        if self.workers > 0:
+            self._workers()
+
+    def _start_workers(self):
+        threads = [threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True) for n in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _work(self):
+        while True:
+            with self.app.app_context():
+                try:
+                    claimed = self._claim()
+                    if claimed is not None:
+                        self._run(claimed)
+                except Exception:
+                    log.exception("Job worker error")
+                    claimed = None
+                finally:
+                    db.session.remove()
+            if claimed is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _claim(self):
+        now = datetime.utcnow()
+        next_id = (
+            select(Job.id)
+            .where(or_(
+                and_(Job.status == 'queued', Job.run_after <= now),
+                and_(Job.status == 'running', Job.updated_at < now - timedelta(seconds=self.lease)),
+            ))
+            .order_by(Job.run_after)
+            .limit(1)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(Job)
+            .where(Job.id == next_id)
+            .values(status='running', attempts=Job.attempts + 1, updated_at=now)
+            .returning(Job.id, Job.kind, Job.payload, Job.user_id, Job.attempts)
+            .execution_options(synchronize_session=False)
+        )
+        row = db.session.execute(stmt).first()
+        db.session.commit()
+        return row
+
+    def _run(self, claimed):
+        handler = self._handlers.get(claimed.kind)
+        user = db.session.get(User, claimed.user_id)
+        try:
+            if handler is None or user is None:
+                raise JobFailed(f"Cannot run job of kind {claimed.kind!r}")
+            result = handler(json.loads(claimed.payload), user)
+        except (RetryJob, *self.retry_on) as e:
+            db.session.rollback()
+            if claimed.attempts >= self.max_attempts:
+                self._finish(claimed.id, 'failed', error=self._message(e))
+            else:
+                delay = self.backoff * 2 ** (claimed.attempts - 1) * random.uniform(0.5, 1.5)
+                self._finish(claimed.id, 'queued', error=self._message(e),
+                             run_after=datetime.utcnow() + timedelta(seconds=delay))
+        except JobFailed as e:
+            db.session.rollback()
+            self._finish(claimed.id, 'failed', error=str(e))
+        except Exception as e:
+            db.session.rollback()
+            log.exception("Job %s failed", claimed.id)
+            self._finish(claimed.id, 'failed', error=self._message(e))
+        else:
+            self._finish(claimed.id, 'succeeded', result=json.dumps(result))
+
+    def _message(self, e):
+        if isinstance(e, (JobFailed, RetryJob, *self.public_errors)):
+            return str(e) or FAILED_MESSAGE
+        return FAILED_MESSAGE
+
+    def _finish(self, job_id, status, result=None, error=None, run_after=None):
+        values = {'status': status, 'updated_at': datetime.utcnow(), 'error': error[:255] if error else None}
+        if result is not None:
+            values['result'] = result
+        if run_after is not None:
+            values['run_after'] = run_after
+        db.session.execute(update(Job).where(Job.id == job_id).values(values).execution_options(synchronize_session=False))
+        db.session.commit()
+
+
+def job_json(job):
+    return {
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+    }
+
+
+job_queue = JobQueue()
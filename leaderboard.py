@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from forksafe import per_process
+from models import db, User, DailyActivity
+
+log = logging.getLogger(__name__)
+
+
+def week_start(now=None):
+    now = now or datetime.utcnow()
+    return datetime(now.year, now.month, now.day) - timedelta(days=now.weekday())
+
+
+class RankedSet:
+    """Scores kept sorted as (-score, user_id) so rank and top-N are reads
+    off a sorted list: rank is a bisect, top-N a slice."""
+
+    def __init__(self):
+        self._keys = []
+        self._scores = {}
+
+    @classmethod
+    def from_scores(cls, scores):
+        """Build from {user_id: score} with a single sort."""
+        ranked = cls()
+        ranked._scores = dict(scores)
+        ranked._keys = sorted((-score, user_id) for user_id, score in ranked._scores.items())
+        return ranked
+
+    def __len__(self):
+        return len(self._keys)
+
+    def set(self, user_id, score):
+        old = self._scores.get(user_id)
+        if old == score:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, user_id))]
+        self._scores[user_id] = score
+        insort(self._keys, (-score, user_id))
+
+    def add(self, user_id, amount):
+        self.set(user_id, self._scores.get(user_id, 0) + amount)
+
+    def discard(self, user_id):
+        old = self._scores.pop(user_id, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, (-old, user_id))]
+
+    def score(self, user_id):
+        return self._scores.get(user_id)
+
+    def rank(self, user_id):
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._keys, (-score, user_id)) + 1
+
+    def top(self, n):
+        return [(user_id, -neg_score) for neg_score, user_id in self._keys[:n]]
+
+
+class Leaderboard:
+    """Per-process leaderboards maintained incrementally from record_usage.
+
+    Holds overall XP, XP per student class and XP earned this week (from
+    the daily_activity rollups). Local writes update the sets in place;
+    the first read loads them, and after start() a background thread
+    rebuilds them from the database every refresh_interval seconds to pick
+    up XP earned through other gunicorn workers. The rollups are written
+    with the buffered ActivityLog, so a rebuild can miss the last second of
+    activity until the following one.
+    """
+
+    def __init__(self, app=None, refresh_interval=60):
+        self.refresh_interval = refresh_interval
+        self.app = None
+        self._lock = threading.Lock()
+        self._loading = threading.Lock()
+        self._refresher = per_process(self._start_refresher)
+        self._loaded_at = None
+        self._week = None
+        self._users = {}        # user_id -> (username, level, student_class)
+        self._overall = RankedSet()
+        self._classes = {}      # student_class -> RankedSet
+        self._weekly = RankedSet()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+
+    def start(self):
+        """Start this process's refresher (see gunicorn.conf.py)."""
+        if self.refresh_interval > 0 and self.app is not None:
+            self._refresher()
+
+    def record(self, user, gained=0):
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            self._roll_week()
+            previous = self._users.get(user.id)
+            if previous and previous[2] != user.student_class:
+                self._class_set(previous[2]).discard(user.id)
+            self._users[user.id] = (user.username, user.level, user.student_class)
+            self._overall.set(user.id, user.xp or 0)
+            self._class_set(user.student_class).set(user.id, user.xp or 0)
+            if gained:
+                self._weekly.add(user.id, gained)
+
+    def top(self, n=5, student_class=None, weekly=False):
+        self._ensure_fresh()
+        with self._lock:
+            self._roll_week()
+            if weekly:
+                ranked = self._weekly
+            elif student_class:
+                ranked = self._classes.get(student_class, RankedSet())
+            else:
+                ranked = self._overall
+            return [self._entry(user_id, score) for user_id, score in ranked.top(n)]
+
+    def rank(self, user):
+        self._ensure_fresh()
+        with self._lock:
+            self._roll_week()
+            if user.id not in self._users:
+                self._users[user.id] = (user.username, user.level, user.student_class)
+                self._overall.set(user.id, user.xp or 0)
+                self._class_set(user.student_class).set(user.id, user.xp or 0)
+            class_set = self._class_set(user.student_class)
+            return {
+                'overall': self._overall.rank(user.id),
+                'overall_total': len(self._overall),
+                'class': class_set.rank(user.id),
+                'class_total': len(class_set),
+                'weekly': self._weekly.rank(user.id),
+                'weekly_xp': self._weekly.score(user.id) or 0,
+            }
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def _ensure_fresh(self):
+        # Only the first read (or one after invalidate) loads; one request
+        # does it while the rest wait, and the refresher keeps it current.
+        if self._loaded_at is None:
+            with self._loading:
+                if self._loaded_at is None:
+                    self._load()
+
+    def _start_refresher(self):
+        thread = threading.Thread(target=self._refresh_loop, name="leaderboard-refresher", daemon=True)
+        thread.start()
+        return thread
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            with self.app.app_context():
+                try:
+                    with self._loading:
+                        self._load()
+                except Exception:
+                    log.exception("Leaderboard refresh failed")
+                finally:
+                    db.session.remove()
+
+    def _load(self):
+        start = week_start()
+        users = db.session.execute(select(User.id, User.username, User.level, User.student_class, User.xp)).all()
+        weekly = db.session.execute(
+            select(DailyActivity.user_id, func.sum(DailyActivity.xp))
+            .where(DailyActivity.day >= start.date())
+            .group_by(DailyActivity.user_id)
+        ).all()
+        info, scores, class_scores = {}, {}, {}
+        for user_id, username, level, student_class, xp in users:
+            info[user_id] = (username, level, student_class)
+            scores[user_id] = xp or 0
+            class_scores.setdefault(student_class, {})[user_id] = xp or 0
+        overall = RankedSet.from_scores(scores)
+        classes = {student_class: RankedSet.from_scores(members) for student_class, members in class_scores.items()}
+        weekly_set = RankedSet.from_scores({user_id: xp for user_id, xp in weekly if xp})
+        with self._lock:
+            self._users, self._overall, self._classes, self._weekly = info, overall, classes, weekly_set
+            self._week = start
+            self._loaded_at = time.monotonic()
+
+    def _roll_week(self):
+        start = week_start()
+        if self._week != start:
+            self._week = start
+            self._weekly = RankedSet()
+
+    def _class_set(self, student_class):
+        return self._classes.setdefault(student_class, RankedSet())
+
+    def _entry(self, user_id, score):
+        username, level, _ = self._users.get(user_id, (None, None, None))
+        return {'username': username, 'xp': score, 'level': level}
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,351 @@
+import email.utils
+import importlib.util
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from budget import estimate_tokens, message_tokens
+
+log = logging.getLogger(__name__)
+
+
+def _lazy_import(name):
+    # The module body runs on first attribute access. groq's generated
+    # pydantic types take ~0.2 s to import, which every worker boot and
+    # every import of app would otherwise pay before the first AI request.
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+groq = _lazy_import('groq')
+
+
+class LLMError(Exception):
+    """An upstream failure with a message that is safe to show users."""
+
+    status = 502
+
+    def __init__(self, message="The AI service returned an error. Please try again.", retry_after=None):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class LLMUnavailable(LLMError):
+    """Transient: upstream down, timing out, or the circuit is open."""
+
+    status = 503
+
+
+class LLMRateLimited(LLMUnavailable):
+    status = 429
+
+
+def retry_after(response):
+    # Groq sends Retry-After in seconds; HTTP also allows a date.
+    if response is None:
+        return None
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(parsed.timestamp() - time.time(), 0.0) if parsed else None
+
+
+class CircuitBreaker:
+    """Opens after threshold consecutive upstream failures and fails fast
+    for reset_after seconds, then lets one probe request through."""
+
+    def __init__(self, threshold=5, reset_after=30):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.reset_after else 'open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_after or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0
+        return max(self.reset_after - (time.monotonic() - self.opened_at), 1)
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.threshold:
+                if self.opened_at is None:
+                    log.warning("LLM circuit opened after %d failures", self.failures)
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class FakeBackend:
+    """Groq-shaped offline backend for load tests (LLM_BACKEND=fake).
+
+    Answers after latency seconds; streams spread that over the tokens.
+    JSON-mode requests get a valid five-question quiz.
+    """
+
+    def __init__(self, latency=0.2, tokens=40):
+        self.latency = latency
+        self.tokens = tokens
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, model, stream=False, response_format=None, **kwargs):
+        if response_format and response_format.get("type") == "json_object":
+            quiz = [{"question": f"Question {i}?", "options": ["A", "B", "C", "D"], "answer": "A"} for i in range(1, 6)]
+            text = json.dumps({"quiz": quiz})
+        else:
+            text = " ".join(f"token{i}" for i in range(self.tokens))
+        if stream:
+            return self._stream(text)
+        time.sleep(self.latency)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=text))],
+            usage=SimpleNamespace(prompt_tokens=sum(len(str(m.get("content", ""))) // 4 for m in messages),
+                                  completion_tokens=self.tokens),
+        )
+
+    def _stream(self, text):
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(self.latency / len(words))
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word if i == 0 else " " + word))])
+
+
+class LLMGateway:
+    """The one way routes talk to the LLM.
+
+    Wraps a Groq client on a pooled keep-alive httpx client with explicit
+    connect/read timeouts. 429s and 5xx/connection errors are retried with
+    full-jitter backoff; a Retry-After header sets the wait instead, and if
+    it is longer than max_wait the 429 goes straight back to the caller.
+    Upstream failures count towards a circuit breaker so that, while Groq
+    is down, requests fail in microseconds instead of holding a worker for
+    the whole timeout. SDK exceptions never leave this module: callers see
+    LLMError and its subclasses. The Groq client is built on the first
+    call, so a missing GROQ_API_KEY fails AI requests with LLMUnavailable
+    instead of failing the whole app at startup.
+
+    Every finished call is reported to on_usage(route, user_id, model,
+    prompt_tokens, completion_tokens, latency_ms, estimated), using
+    upstream's usage numbers when it sends them and local estimates if not.
+    Every call, failed or not, goes to on_call(model, route, seconds,
+    outcome) and every retry to on_retry(model), for instrumentation.
+    """
+
+    def __init__(self, app=None):
+        self._backend = None
+        self._settings = {}
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker()
+        self.max_retries = 2
+        self.backoff = 0.5
+        self.max_wait = 10.0
+        self.retries = 0
+        self.on_usage = None
+        self.on_call = None
+        self.on_retry = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.max_retries = int(config.get('LLM_MAX_RETRIES', self.max_retries))
+        self.backoff = float(config.get('LLM_RETRY_BACKOFF', self.backoff))
+        self.max_wait = float(config.get('LLM_RETRY_MAX_WAIT', self.max_wait))
+        self.breaker = CircuitBreaker(int(config.get('LLM_BREAKER_THRESHOLD', 5)),
+                                      float(config.get('LLM_BREAKER_RESET', 30)))
+        self._backend = None
+        if config.get('LLM_BACKEND', 'groq') == 'fake':
+            self._backend = FakeBackend(latency=float(config.get('LLM_FAKE_LATENCY', 0.2)),
+                                        tokens=int(config.get('LLM_FAKE_TOKENS', 40)))
+            return
+        if not config.get('GROQ_API_KEY'):
+            log.error("GROQ_API_KEY is not set; AI routes will answer 503")
+        self._settings = {
+            'api_key': config.get('GROQ_API_KEY'),
+            'read_timeout': float(config.get('LLM_READ_TIMEOUT', 60)),
+            'connect_timeout': float(config.get('LLM_CONNECT_TIMEOUT', 5)),
+            'pool': int(config.get('LLM_POOL_SIZE', 20)),
+        }
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._connect()
+        return self._backend
+
+    @backend.setter
+    def backend(self, value):
+        self._backend = value
+
+    def _connect(self):
+        settings = self._settings
+        if not settings.get('api_key'):
+            raise LLMUnavailable("The AI service is not configured. Please try again later.")
+        timeout = httpx.Timeout(settings['read_timeout'], connect=settings['connect_timeout'])
+        pool = settings['pool']
+        http_client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool, max_keepalive_connections=pool, keepalive_expiry=30),
+        )
+        # The SDK's own retries would bypass the breaker, so they're off.
+        return groq.Groq(api_key=settings['api_key'], http_client=http_client,
+                         timeout=timeout, max_retries=0)
+
+    def complete(self, messages, model, route=None, user_id=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            backend = self.backend
+            response = self._call(model, lambda: backend.chat.completions.create(messages=messages, model=model, **kwargs))
+        except LLMError as e:
+            self._observe(model, route, start, e)
+            raise
+        self._observe(model, route, start)
+        content = response.choices[0].message.content
+        self._report(route, user_id, model, messages, content, start, getattr(response, 'usage', None))
+        return content
+
+    def stream(self, messages, model, route=None, user_id=None, **kwargs):
+        # Retries cover opening the stream; once tokens have been sent to
+        # the client a failure can only be reported. _call has settled the
+        # breaker (and any half-open probe) by the time the stream opens.
+        start = time.perf_counter()
+        parts, usage = [], None
+        try:
+            backend = self.backend
+            chunks = self._call(model, lambda: backend.chat.completions.create(messages=messages, model=model, stream=True, **kwargs))
+            for chunk in chunks:
+                # Groq puts the request's usage on the last chunk.
+                usage = getattr(getattr(chunk, 'x_groq', None), 'usage', None) or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except LLMError as e:
+            self._observe(model, route, start, e)
+            raise
+        except (groq.APIError, httpx.HTTPError) as e:
+            self.breaker.failure()
+            error = self._translate(e)
+            self._observe(model, route, start, error)
+            raise error from e
+        self._observe(model, route, start)
+        self._report(route, user_id, model, messages, "".join(parts), start, usage)
+
+    def _observe(self, model, route, start, error=None):
+        if self.on_call is None:
+            return
+        if error is None:
+            outcome = 'ok'
+        elif isinstance(error, LLMRateLimited):
+            outcome = 'rate_limited'
+        elif isinstance(error, LLMUnavailable):
+            outcome = 'unavailable'
+        else:
+            outcome = 'error'
+        self.on_call(model, route, time.perf_counter() - start, outcome)
+
+    def _report(self, route, user_id, model, messages, content, start, usage):
+        if self.on_usage is None:
+            return
+        latency_ms = (time.perf_counter() - start) * 1000
+        if usage is not None and getattr(usage, 'prompt_tokens', None) is not None:
+            self.on_usage(route, user_id, model, usage.prompt_tokens, usage.completion_tokens, latency_ms, False)
+        else:
+            self.on_usage(route, user_id, model, message_tokens(messages), estimate_tokens(content), latency_ms, True)
+
+    def _call(self, model, request):
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise LLMUnavailable("The AI service is temporarily unavailable. Please try again shortly.",
+                                     retry_after=self.breaker.retry_in())
+            try:
+                result = request()
+            except groq.RateLimitError as e:
+                # Throttling is not an outage; it doesn't count towards the breaker.
+                self.breaker.success()
+                wait = retry_after(e.response)
+                error = e
+            except (groq.APIConnectionError, groq.InternalServerError) as e:
+                self.breaker.failure()
+                wait = None
+                error = e
+            except groq.APIStatusError as e:
+                self.breaker.success()
+                raise self._translate(e) from e
+            except BaseException:
+                # Anything else (a bad response, the greenlet being killed)
+                # still has to release a half-open probe, or the breaker
+                # stays stuck refusing every call.
+                self.breaker.failure()
+                raise
+            else:
+                self.breaker.success()
+                return result
+            if attempt == self.max_retries or (wait is not None and wait > self.max_wait):
+                raise self._translate(error) from error
+            self.retries += 1
+            if self.on_retry is not None:
+                self.on_retry(model)
+            time.sleep(wait if wait is not None else random.uniform(0, self.backoff * 2 ** attempt))
+
+    def _translate(self, e):
+        if isinstance(e, groq.RateLimitError):
+            return LLMRateLimited("The AI service is busy. Please try again in a moment.",
+                                  retry_after=retry_after(e.response))
+        if isinstance(e, (groq.APITimeoutError, httpx.TimeoutException)):
+            return LLMUnavailable("The AI service took too long to respond. Please try again.")
+        if isinstance(e, (groq.APIConnectionError, groq.InternalServerError, httpx.HTTPError)):
+            return LLMUnavailable("The AI service is temporarily unavailable. Please try again shortly.",
+                                  retry_after=retry_after(getattr(e, 'response', None)))
+        log.warning("LLM request rejected: %s", e)
+        return LLMError("The AI service could not process this request.")
+
+
+llm = LLMGateway()
@@ -0,0 +1,235 @@
+import bisect
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(name, labels, value):
+    if labels:
+        name += "{" + ",".join(f'{key}="{_escape(v)}"' for key, v in labels) + "}"
+    return f"{name} {value:.6g}" if isinstance(value, float) else f"{name} {value}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount=1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for values, total in items:
+            yield self.name, list(zip(self.labels, values)), total
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(values, list(series)) for values, series in self._series.items()]
+        for values, series in items:
+            labels = list(zip(self.labels, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + [("le", "+Inf" if bound == float("inf") else f"{bound:g}")], cumulative
+            yield f"{self.name}_sum", labels, float(series[-1])
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Metrics:
+    """In-process counters and histograms in the Prometheus text format.
+
+    Every request is timed to its response headers and labelled by URL
+    rule, and SQL statements, template renders and LLM calls made while it
+    runs are added to its profile. Recording is a few perf_counter() calls
+    and a locked dict update. With SLOW_REQUEST_MS set, requests slower than
+    that are logged with the breakdown.
+
+    Each gunicorn worker keeps its own numbers; samples carry a worker
+    label so series from different workers stay apart in Prometheus.
+    """
+
+    def __init__(self, app=None):
+        self.slow_request_ms = 0
+        self._metrics = []
+        self._caches = {}
+        self.requests = self.histogram(
+            "http_request_duration_seconds", "Time from request to response headers.", ("route", "method", "status"))
+        self.request_queries = self.histogram(
+            "http_request_db_queries", "SQL statements per request.", ("route",), QUERY_BUCKETS)
+        self.request_db_time = self.histogram(
+            "http_request_db_seconds", "Time spent in SQL per request.", ("route",))
+        self.queries = self.counter("db_queries_total", "SQL statements executed, in or out of requests.")
+        self.query_time = self.counter("db_query_seconds_total", "Time spent executing SQL.")
+        self.llm_latency = self.histogram(
+            "llm_request_duration_seconds", "LLM call latency including retries.", ("model", "route", "outcome"))
+        self.llm_retries = self.counter("llm_retries_total", "LLM calls retried after a transient failure.", ("model",))
+        self.quota_rejections = self.counter(
+            "quota_rejections_total", "Requests refused because the daily limit was reached.", ("route",))
+        self.errors = self.counter("http_request_errors_total", "Requests answered with a 5xx status.", ("route",))
+        if app is not None:
+            self.init_app(app)
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def watch_cache(self, name, cache):
+        # Anything with hits and misses counters; read at scrape time.
+        self._caches[name] = cache
+
+    def init_app(self, app):
+        self.slow_request_ms = float(app.config.get('SLOW_REQUEST_MS') or 0)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._template_start, app)
+        template_rendered.connect(self._template_end, app)
+        if not event.contains(Engine, "before_cursor_execute", _query_start):
+            event.listen(Engine, "before_cursor_execute", _query_start)
+            event.listen(Engine, "after_cursor_execute", _query_end)
+
+    # ---- request profile -------------------------------------------------
+
+    def _start(self):
+        g.profile = {'start': time.perf_counter(), 'db': 0, 'db_s': 0.0, 'llm': 0, 'llm_s': 0.0, 'template_s': 0.0}
+
+    def _finish(self, response):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return response
+        elapsed = time.perf_counter() - profile['start']
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        self.requests.observe(elapsed, route, request.method, str(response.status_code))
+        self.request_queries.observe(profile['db'], route)
+        self.request_db_time.observe(profile['db_s'], route)
+        if response.status_code >= 500:
+            self.errors.inc(route)
+        if self.slow_request_ms and elapsed * 1000 >= self.slow_request_ms:
+            other = elapsed - profile['db_s'] - profile['llm_s'] - profile['template_s']
+            log.warning("Slow request %s %s %d: %.0f ms (db %d queries %.0f ms, llm %d calls %.0f ms, templates %.0f ms, other %.0f ms)",
+                        request.method, request.path, response.status_code, elapsed * 1000,
+                        profile['db'], profile['db_s'] * 1000, profile['llm'], profile['llm_s'] * 1000,
+                        profile['template_s'] * 1000, other * 1000)
+        return response
+
+    def _template_start(self, sender, template, context, **extra):
+        g.setdefault('template_starts', []).append(time.perf_counter())
+
+    def _template_end(self, sender, template, context, **extra):
+        starts = g.get('template_starts')
+        profile = g.get('profile')
+        if starts and profile is not None:
+            profile['template_s'] += time.perf_counter() - starts.pop()
+
+    # ---- hooks for other modules -------------------------------------------
+
+    def llm_call(self, model, route, seconds, outcome):
+        self.llm_latency.observe(seconds, model, route or '', outcome)
+        profile = _profile()
+        if profile is not None:
+            profile['llm'] += 1
+            profile['llm_s'] += seconds
+
+    def llm_retry(self, model):
+        self.llm_retries.inc(model)
+
+    def quota_rejected(self, route):
+        self.quota_rejections.inc(route)
+
+    # ---- exposition --------------------------------------------------------
+
+    def render(self):
+        worker = ("worker", str(os.getpid()))
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(_format(name, [worker] + labels, value) for name, labels, value in metric.samples())
+        lines.append("# HELP cache_hits_total Lookups answered from an in-process cache.")
+        lines.append("# TYPE cache_hits_total counter")
+        lines.extend(_format("cache_hits_total", [worker, ("cache", name)], _hits(cache)) for name, cache in self._caches.items())
+        lines.append("# HELP cache_misses_total Lookups an in-process cache could not answer.")
+        lines.append("# TYPE cache_misses_total counter")
+        lines.extend(_format("cache_misses_total", [worker, ("cache", name)], cache.misses) for name, cache in self._caches.items())
+        lines.append("# HELP cache_hit_ratio Hits over lookups since the worker started.")
+        lines.append("# TYPE cache_hit_ratio gauge")
+        for name, cache in self._caches.items():
+            lookups = _hits(cache) + cache.misses
+            lines.append(_format("cache_hit_ratio", [worker, ("cache", name)], round(_hits(cache) / lookups, 4) if lookups else 0.0))
+        return "\n".join(lines) + "\n"
+
+
+def _hits(cache):
+    return cache.hits + getattr(cache, 'similar_hits', 0)
+
+
+def _profile():
+    return g.get('profile') if has_request_context() else None
+
+
+def _query_start(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _query_end(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    metrics.queries.inc()
+    metrics.query_time.inc(amount=elapsed)
+    profile = _profile()
+    if profile is not None:
+        profile['db'] += 1
+        profile['db_s'] += elapsed
+
+
+metrics = Metrics()
@@ -0,0 +1,33 @@
+"""add indexes on hot query columns
+
+Revision ID: 3f2a9c1d7b04
+Revises: 
+Create Date: 2026-10-18 10:40:00.000000
+
+Tables were historically created by db.create_all(), which already builds
+these indexes on fresh databases, hence if_not_exists.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b04'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_user_xp', 'user', ['xp'], if_not_exists=True)
+    op.create_index('ix_note_user_created', 'note', ['user_id', 'created_at'], if_not_exists=True)
+    op.create_index('ix_activity_log_user_timestamp', 'activity_log', ['user_id', 'timestamp'], if_not_exists=True)
+    op.create_index('ix_quiz_score_user_timestamp', 'quiz_score', ['user_id', 'timestamp'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_quiz_score_user_timestamp', table_name='quiz_score')
+    op.drop_index('ix_activity_log_user_timestamp', table_name='activity_log')
+    op.drop_index('ix_note_user_created', table_name='note')
+    op.drop_index('ix_user_xp', table_name='user')
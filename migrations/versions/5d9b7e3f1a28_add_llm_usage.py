@@ -0,0 +1,42 @@
+"""record LLM token usage per route
+
+Revision ID: 5d9b7e3f1a28
+Revises: e2a8f61b9c45
+Create Date: 2026-10-18 13:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d9b7e3f1a28'
+down_revision = 'e2a8f61b9c45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('llm_usage'):
+        op.create_table(
+            'llm_usage',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('route', sa.String(length=30), nullable=False),
+            sa.Column('model', sa.String(length=100), nullable=True),
+            sa.Column('prompt_tokens', sa.Integer(), nullable=True),
+            sa.Column('completion_tokens', sa.Integer(), nullable=True),
+            sa.Column('latency_ms', sa.Integer(), nullable=True),
+            sa.Column('estimated', sa.Boolean(), nullable=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    op.create_index('ix_llm_usage_route_timestamp', 'llm_usage', ['route', 'timestamp'], if_not_exists=True)
+    op.create_index('ix_llm_usage_user_timestamp', 'llm_usage', ['user_id', 'timestamp'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_llm_usage_user_timestamp', table_name='llm_usage')
+    op.drop_index('ix_llm_usage_route_timestamp', table_name='llm_usage')
+    op.drop_table('llm_usage')
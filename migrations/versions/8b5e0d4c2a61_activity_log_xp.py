@@ -0,0 +1,29 @@
+"""record XP per activity log row
+
+Revision ID: 8b5e0d4c2a61
+Revises: 3f2a9c1d7b04
+Create Date: 2026-10-18 11:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e0d4c2a61'
+down_revision = '3f2a9c1d7b04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('activity_log')]
+    if 'xp' not in columns:
+        op.add_column('activity_log', sa.Column('xp', sa.Integer(), nullable=True))
+    op.create_index('ix_activity_log_timestamp', 'activity_log', ['timestamp'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_activity_log_timestamp', table_name='activity_log')
+    with op.batch_alter_table('activity_log') as batch_op:
+        batch_op.drop_column('xp')
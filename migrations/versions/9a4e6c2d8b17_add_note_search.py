@@ -0,0 +1,49 @@
+"""full-text search over notes
+
+Revision ID: 9a4e6c2d8b17
+Revises: 5d9b7e3f1a28
+Create Date: 2026-10-18 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4e6c2d8b17'
+down_revision = '5d9b7e3f1a28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'sqlite':
+        return
+    exists = sa.inspect(bind).has_table('note_fts')
+    op.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5(
+        user_id, title, content,
+        content='note', content_rowid='id',
+        tokenize='porter unicode61', prefix='2 3'
+    )""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS note_fts_insert AFTER INSERT ON note BEGIN
+        INSERT INTO note_fts(rowid, user_id, title, content) VALUES (new.id, new.user_id, new.title, new.content);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS note_fts_delete AFTER DELETE ON note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, user_id, title, content) VALUES ('delete', old.id, old.user_id, old.title, old.content);
+    END""")
+    op.execute("""CREATE TRIGGER IF NOT EXISTS note_fts_update AFTER UPDATE ON note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, user_id, title, content) VALUES ('delete', old.id, old.user_id, old.title, old.content);
+        INSERT INTO note_fts(rowid, user_id, title, content) VALUES (new.id, new.user_id, new.title, new.content);
+    END""")
+    if not exists:
+        op.execute("INSERT INTO note_fts(note_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER IF EXISTS note_fts_update")
+    op.execute("DROP TRIGGER IF EXISTS note_fts_delete")
+    op.execute("DROP TRIGGER IF EXISTS note_fts_insert")
+    op.execute("DROP TABLE IF EXISTS note_fts")
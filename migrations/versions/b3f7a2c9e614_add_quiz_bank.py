@@ -0,0 +1,56 @@
+"""bank of validated quiz questions per topic
+
+Revision ID: b3f7a2c9e614
+Revises: 9a4e6c2d8b17
+Create Date: 2026-10-18 15:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3f7a2c9e614'
+down_revision = '9a4e6c2d8b17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('quiz_topic'):
+        op.create_table(
+            'quiz_topic',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('key', sa.String(length=40), nullable=False),
+            sa.Column('student_class', sa.String(length=50), nullable=True),
+            sa.Column('subject', sa.String(length=100), nullable=True),
+            sa.Column('topic', sa.String(length=200), nullable=False),
+            sa.Column('requests', sa.Integer(), nullable=True),
+            sa.Column('question_count', sa.Integer(), nullable=True),
+            sa.Column('last_requested_at', sa.DateTime(), nullable=True),
+            sa.Column('warmed_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('key'),
+        )
+    op.create_index('ix_quiz_topic_last_requested', 'quiz_topic', ['last_requested_at'], if_not_exists=True)
+    if not inspector.has_table('quiz_question'):
+        op.create_table(
+            'quiz_question',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('topic_id', sa.Integer(), nullable=False),
+            sa.Column('fingerprint', sa.String(length=40), nullable=False),
+            sa.Column('question', sa.Text(), nullable=False),
+            sa.Column('options', sa.Text(), nullable=False),
+            sa.Column('answer', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['topic_id'], ['quiz_topic.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('topic_id', 'fingerprint', name='uq_quiz_question_topic_fingerprint'),
+        )
+
+
+def downgrade():
+    op.drop_table('quiz_question')
+    op.drop_index('ix_quiz_topic_last_requested', table_name='quiz_topic')
+    op.drop_table('quiz_topic')
@@ -0,0 +1,41 @@
+"""add uploaded document store
+
+Revision ID: c7d1e5a90f32
+Revises: 8b5e0d4c2a61
+Create Date: 2026-10-18 11:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d1e5a90f32'
+down_revision = '8b5e0d4c2a61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('document'):
+        op.create_table(
+            'document',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sha256', sa.String(length=64), nullable=False),
+            sa.Column('filename', sa.String(length=255), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('page_count', sa.Integer(), nullable=True),
+            sa.Column('error', sa.String(length=255), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    op.create_index('ix_document_sha256', 'document', ['sha256'], if_not_exists=True)
+    op.create_index('ix_document_user_id', 'document', ['user_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_document_user_id', table_name='document')
+    op.drop_index('ix_document_sha256', table_name='document')
+    op.drop_table('document')
@@ -0,0 +1,61 @@
+"""per-user daily activity rollups
+
+Revision ID: d6c4a1f8e237
+Revises: b3f7a2c9e614
+Create Date: 2026-10-18 16:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6c4a1f8e237'
+down_revision = 'b3f7a2c9e614'
+branch_labels = None
+depends_on = None
+
+# Same backfill as rollups.backfill_statement, frozen here.
+BACKFILL = """
+INSERT INTO daily_activity (user_id, day, subject, requests, xp, quizzes, quiz_correct, quiz_total)
+SELECT user_id, day, subject, sum(requests), sum(xp), sum(quizzes), sum(quiz_correct), sum(quiz_total)
+FROM (
+    SELECT user_id, {day} AS day, substr(coalesce(subject, ''), 1, 200) AS subject,
+           sum(CASE WHEN action LIKE 'Completed Quiz%' THEN 0 ELSE 1 END) AS requests,
+           coalesce(sum(xp), 0) AS xp, 0 AS quizzes, 0 AS quiz_correct, 0 AS quiz_total
+    FROM activity_log GROUP BY user_id, {day}, substr(coalesce(subject, ''), 1, 200)
+    UNION ALL
+    SELECT user_id, {day}, substr(coalesce(topic, ''), 1, 200), 0, 0, count(*), coalesce(sum(score), 0), coalesce(sum(total_questions), 0)
+    FROM quiz_score GROUP BY user_id, {day}, substr(coalesce(topic, ''), 1, 200)
+) AS raw
+WHERE NOT EXISTS (SELECT 1 FROM daily_activity)
+GROUP BY user_id, day, subject
+"""
+
+DAY = {'sqlite': 'date("timestamp")', 'postgresql': 'CAST("timestamp" AS DATE)'}
+
+
+def upgrade():
+    bind = op.get_bind()
+    if not sa.inspect(bind).has_table('daily_activity'):
+        op.create_table(
+            'daily_activity',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('subject', sa.String(length=200), nullable=False),
+            sa.Column('requests', sa.Integer(), nullable=False),
+            sa.Column('xp', sa.Integer(), nullable=False),
+            sa.Column('quizzes', sa.Integer(), nullable=False),
+            sa.Column('quiz_correct', sa.Integer(), nullable=False),
+            sa.Column('quiz_total', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('user_id', 'day', 'subject'),
+        )
+    op.create_index('ix_daily_activity_day', 'daily_activity', ['day'], if_not_exists=True)
+    if bind.dialect.name in DAY:
+        op.execute(BACKFILL.format(day=DAY[bind.dialect.name]))
+
+
+def downgrade():
+    op.drop_index('ix_daily_activity_day', table_name='daily_activity')
+    op.drop_table('daily_activity')
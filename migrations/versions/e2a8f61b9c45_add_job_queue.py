@@ -0,0 +1,44 @@
+"""add background job queue
+
+Revision ID: e2a8f61b9c45
+Revises: c7d1e5a90f32
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a8f61b9c45'
+down_revision = 'c7d1e5a90f32'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table('job'):
+        op.create_table(
+            'job',
+            sa.Column('id', sa.String(length=32), nullable=False),
+            sa.Column('kind', sa.String(length=50), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('result', sa.Text(), nullable=True),
+            sa.Column('error', sa.String(length=255), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=True),
+            sa.Column('run_after', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+        )
+    op.create_index('ix_job_user_id', 'job', ['user_id'], if_not_exists=True)
+    op.create_index('ix_job_status_run_after', 'job', ['status', 'run_after'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_job_status_run_after', table_name='job')
+    op.drop_index('ix_job_user_id', table_name='job')
+    op.drop_table('job')
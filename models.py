@@ -23,6 +23,8 @@ class User(UserMixin, db.Model):
     xp = db.Column(db.Integer, default=0)
     level = db.Column(db.Integer, default=1)
     
+    __table_args__ = (db.Index('ix_user_xp', 'xp'),)
+
     notes = db.relationship('Note', backref='user', lazy=True)
     logs = db.relationship('ActivityLog', backref='user', lazy=True)
     quiz_scores = db.relationship('QuizScore', backref='user', lazy=True)
@@ -34,13 +36,21 @@ class Note(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_note_user_created', 'user_id', 'created_at'),)
+
 class ActivityLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     subject = db.Column(db.String(50))
     action = db.Column(db.String(100)) # e.g., "Asked Question", "Generated Notes"
+    xp = db.Column(db.Integer, default=0)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_activity_log_user_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_activity_log_timestamp', 'timestamp'),
+    )
+
 class QuizScore(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     topic = db.Column(db.String(200))
@@ -49,3 +59,83 @@ class QuizScore(db.Model):
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (db.Index('ix_quiz_score_user_timestamp', 'user_id', 'timestamp'),)
+
+class Document(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), default='processing') # processing, ready, failed
+    page_count = db.Column(db.Integer)
+    error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False) # JSON
+    status = db.Column(db.String(20), default='queued') # queued, running, succeeded, failed
+    result = db.Column(db.Text) # JSON
+    error = db.Column(db.String(255))
+    attempts = db.Column(db.Integer, default=0)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+
+    __table_args__ = (db.Index('ix_job_status_run_after', 'status', 'run_after'),)
+
+class LLMUsage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    route = db.Column(db.String(30), nullable=False) # ask, notes, quiz, pdf, vision
+    model = db.Column(db.String(100))
+    prompt_tokens = db.Column(db.Integer, default=0)
+    completion_tokens = db.Column(db.Integer, default=0)
+    latency_ms = db.Column(db.Integer, default=0)
+    estimated = db.Column(db.Boolean, default=False) # counted locally, upstream sent no usage
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_llm_usage_route_timestamp', 'route', 'timestamp'),
+        db.Index('ix_llm_usage_user_timestamp', 'user_id', 'timestamp'),
+    )
+
+class QuizTopic(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(40), unique=True, nullable=False) # sha1 of normalized class, subject and topic
+    student_class = db.Column(db.String(50))
+    subject = db.Column(db.String(100))
+    topic = db.Column(db.String(200), nullable=False)
+    requests = db.Column(db.Integer, default=0)
+    question_count = db.Column(db.Integer, default=0)
+    last_requested_at = db.Column(db.DateTime, default=datetime.utcnow)
+    warmed_at = db.Column(db.DateTime) # last claimed by the warmer
+
+    __table_args__ = (db.Index('ix_quiz_topic_last_requested', 'last_requested_at'),)
+
+class QuizQuestion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    topic_id = db.Column(db.Integer, db.ForeignKey('quiz_topic.id'), nullable=False)
+    fingerprint = db.Column(db.String(40), nullable=False) # sha1 of the normalized question text
+    question = db.Column(db.Text, nullable=False)
+    options = db.Column(db.Text, nullable=False) # JSON list
+    answer = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('topic_id', 'fingerprint', name='uq_quiz_question_topic_fingerprint'),)
+
+class DailyActivity(db.Model):
+    # Per-user, per-day (UTC), per-subject totals of ActivityLog; written in
+    # the same transaction as the raw rows, which can then be aged out.
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    subject = db.Column(db.String(200), primary_key=True, default='')
+    requests = db.Column(db.Integer, nullable=False, default=0) # charged AI requests
+    xp = db.Column(db.Integer, nullable=False, default=0)
+    quizzes = db.Column(db.Integer, nullable=False, default=0) # completed quizzes; subject is the quiz topic
+    quiz_correct = db.Column(db.Integer, nullable=False, default=0)
+    quiz_total = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_daily_activity_day', 'day'),)
@@ -0,0 +1,84 @@
+import gzip
+import hashlib
+import threading
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import request, session, make_response, Response
+from flask_login import current_user
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class _Page:
+    def __init__(self, body, mimetype):
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self.bodies = {'identity': body, 'gzip': gzip.compress(body, 9)}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body, quality=11)
+
+
+class PageCache:
+    """Render-once cache for pages whose HTML only depends on the URL.
+
+    Anonymous requests are served from a per-process copy of the rendered
+    page, pre-compressed with brotli and gzip, with a strong ETag and
+    Last-Modified so crawlers and repeat visitors get 304s. Logged-in users
+    (the nav shows their credits) and requests with pending flash messages
+    always render fresh.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def cached(self, view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if '_flashes' in session or current_user.is_authenticated:
+                return view(*args, **kwargs)
+            page = self._pages.get(request.path)
+            if page is None:
+                self.misses += 1
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                page = _Page(response.get_data(), response.mimetype)
+                with self._lock:
+                    self._pages[request.path] = page
+            else:
+                self.hits += 1
+            return self._respond(page)
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def _respond(self, page):
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in page.bodies and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+        response = Response(page.bodies[encoding], mimetype=page.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding, Cookie'
+        # Each encoding is its own representation, so each gets its own strong tag.
+        response.set_etag(page.etag if encoding == 'identity' else f"{page.etag}-{encoding}")
+        response.last_modified = page.last_modified
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response.make_conditional(request)
+
+
+page_cache = PageCache()
@@ -0,0 +1,45 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import db
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(timestamp, id):
+    return base64.urlsafe_b64encode(f"{timestamp.isoformat()}|{id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    # Raises ValueError for anything that isn't a cursor we handed out.
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    timestamp, id = raw.split("|")
+    return datetime.fromisoformat(timestamp), int(id)
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+def keyset_page(stmt, sort_column, id_column, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Newest-first page of stmt's rows after cursor.
+
+    Seeks with (sort_column, id) < cursor instead of OFFSET, so page 500
+    costs the same as page 1 on a (user_id, sort_column) index; id breaks
+    ties between rows with the same timestamp. stmt must select both
+    columns. Returns (rows, next_cursor), next_cursor None on the last page.
+    """
+    if cursor:
+        stmt = stmt.where(tuple_(sort_column, id_column) < tuple_(*decode_cursor(cursor)))
+    rows = db.session.execute(stmt.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1)).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]._mapping
+    return rows, encode_cursor(last[sort_column], last[id_column])
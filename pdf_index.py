@@ -0,0 +1,139 @@
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+
+_TOKEN = re.compile(r"\w+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what when where which who why how with"
+    .split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def content_hash(stream, block_size=1 << 20):
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(block_size), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def iter_pages(stream, max_pages=None):
+    # pypdf parses page objects on access, so pages are extracted one at a
+    # time and only the resulting text is kept. Imported here: only PDF
+    # routes need it and it adds ~0.1 s to startup.
+    from pypdf import PdfReader
+    reader = PdfReader(stream)
+    for number, page in enumerate(reader.pages, start=1):
+        if max_pages and number > max_pages:
+            return
+        yield number, page.extract_text() or ""
+
+
+def iter_chunks(pages, size=180, overlap=40):
+    # Word windows that never cross a page boundary, so each chunk can be
+    # cited by page number.
+    step = size - overlap
+    for number, text in pages:
+        words = text.split()
+        for start in range(0, max(len(words) - overlap, 1), step):
+            chunk = " ".join(words[start:start + size])
+            if chunk:
+                yield number, chunk
+
+
+class BM25Index:
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.pages = []
+        self.texts = []
+        self.lengths = []
+        self.postings = {}  # term -> [(chunk_id, term frequency)]
+        for chunk_id, (page, text) in enumerate(chunks):
+            terms = Counter(tokenize(text))
+            self.pages.append(page)
+            self.texts.append(text)
+            self.lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self.postings.setdefault(term, []).append((chunk_id, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.size = sum(len(t) for t in self.texts)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def search(self, query, k=5):
+        n = len(self.texts)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[chunk_id] / self.avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        # Best match first: fit_context trims from the end when over budget.
+        best = sorted(scores, key=lambda i: (-scores[i], i))[:k]
+        return [(self.pages[i], self.texts[i]) for i in best]
+
+    def overview(self, k=5):
+        # No query terms matched ("Summarize"): spread the picks over the document.
+        n = len(self.texts)
+        if n <= k:
+            return list(zip(self.pages, self.texts))
+        return [(self.pages[i * n // k], self.texts[i * n // k]) for i in range(k)]
+
+    def context(self, query, k=5):
+        chunks = self.search(query, k) or self.overview(k)
+        return "\n\n".join(f"[Page {page}] {text}" for page, text in chunks)
+
+
+class PdfIndexCache:
+    """LRU of BM25 indexes keyed by PDF content hash, bounded by the total
+    characters of indexed text rather than by entry count."""
+
+    def __init__(self, max_chars=64 * 1024 * 1024, max_pages=1000):
+        self.max_chars = max_chars
+        self.max_pages = max_pages
+        self.hits = 0
+        self.misses = 0
+        self._indexes = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            index = self._indexes.get(digest)
+            if index is not None:
+                self._indexes.move_to_end(digest)
+                self.hits += 1
+            return index
+
+    def put(self, digest, index):
+        with self._lock:
+            if digest in self._indexes:
+                return
+            self._indexes[digest] = index
+            self._chars += index.size
+            while self._chars > self.max_chars and len(self._indexes) > 1:
+                _, evicted = self._indexes.popitem(last=False)
+                self._chars -= evicted.size
+
+    def get_or_build(self, stream):
+        digest = content_hash(stream)
+        index = self.get(digest)
+        if index is None:
+            self.misses += 1
+            index = BM25Index(iter_chunks(iter_pages(stream, self.max_pages)))
+            self.put(digest, index)
+        return index
+
+
+pdf_indexes = PdfIndexCache()
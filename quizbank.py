@@ -0,0 +1,284 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from cache import normalize
+from forksafe import per_process
+from llm import LLMError
+from models import db, QuizTopic, QuizQuestion
+
+log = logging.getLogger(__name__)
+
+QUIZ_SIZE = 5
+
+# Models often answer with the option letter: "B", "b)", "(B) Paris".
+_LETTER = re.compile(r"^\(?([A-Fa-f])(?:[).:\]]|\s|$)")
+
+
+class InvalidQuiz(ValueError):
+    """The completion did not contain enough usable questions."""
+
+
+def clean_question(item):
+    """Return item as {question, options, answer} or raise InvalidQuiz.
+
+    Needs a question, two to six distinct options and an answer that is
+    one of them; a letter answer is mapped to the option it points at.
+    """
+    if not isinstance(item, dict) or not isinstance(item.get('options'), list):
+        raise InvalidQuiz("question is not an object with a list of options")
+    question = str(item.get('question') or '').strip()
+    options = [str(option).strip() for option in item['options'] if str(option).strip()]
+    if not question:
+        raise InvalidQuiz("empty question")
+    if not 2 <= len(options) <= 6 or len({normalize(o) for o in options}) != len(options):
+        raise InvalidQuiz("options must be two to six distinct answers")
+    answer = str(item.get('answer') or '').strip()
+    if answer not in options:
+        matches = [o for o in options if normalize(o) == normalize(answer)]
+        letter = _LETTER.match(answer)
+        if matches:
+            answer = matches[0]
+        elif letter and ord(letter.group(1).upper()) - ord('A') < len(options):
+            answer = options[ord(letter.group(1).upper()) - ord('A')]
+        else:
+            raise InvalidQuiz("answer is not one of the options")
+    return {'question': question, 'options': options, 'answer': answer}
+
+
+def parse_quiz(content, minimum=QUIZ_SIZE):
+    """Validated questions from a JSON quiz completion.
+
+    Broken questions are dropped; the quiz is rejected only when fewer
+    than minimum survive.
+    """
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError):
+        raise InvalidQuiz("completion is not JSON")
+    items = data.get('quiz') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise InvalidQuiz("no list of questions")
+    questions, seen = [], set()
+    for item in items:
+        try:
+            question = clean_question(item)
+        except InvalidQuiz:
+            continue
+        if fingerprint(question) not in seen:
+            seen.add(fingerprint(question))
+            questions.append(question)
+    if len(questions) < minimum:
+        raise InvalidQuiz(f"{len(questions)} usable questions, need {minimum}")
+    return questions
+
+
+def topic_key(student_class, subject, topic):
+    return hashlib.sha1("\0".join(normalize(p) for p in (student_class, subject, topic)).encode("utf-8")).hexdigest()
+
+
+def fingerprint(question):
+    return hashlib.sha1(normalize(question['question']).encode("utf-8")).hexdigest()
+
+
+def warm_hours(value):
+    # "2-6" -> the UTC hours 2, 3, 4 and 5; "22-4" wraps past midnight.
+    if not value:
+        return None
+    start, end = (int(part) % 24 for part in str(value).split('-'))
+    return {(start + h) % 24 for h in range((end - start) % 24 or 24)}
+
+
+class QuizBank:
+    """Validated quiz questions per (student class, subject, topic).
+
+    Requests draw a random QUIZ_SIZE sample from the topic's bank, one
+    indexed read and no LLM call; only a topic with fewer than QUIZ_SIZE
+    banked questions is generated on the request path, and what comes back
+    is banked. Draws are counted as demand in memory. A warmer thread in
+    each process wakes every warm_interval seconds, writes that demand,
+    and (only within warm_hours, UTC, when set) tops up the most requested
+    recent topics toward target questions, batch at a time, through the
+    function registered with @generator. A topic is claimed with a conditional UPDATE on warmed_at,
+    so gunicorn workers never warm the same topic in one pass. Questions
+    are deduplicated on their normalized text.
+    """
+
+    def __init__(self, app=None, target=30, batch=10, warm_interval=300, warm_topics=20, recent_days=7):
+        self.target = target
+        self.batch = batch
+        self.warm_interval = warm_interval
+        self.warm_topics = warm_topics
+        self.warm_hours = None
+        self.recent_days = recent_days
+        self.app = None
+        self.hits = 0
+        self.misses = 0
+        self._generate = None
+        self._demand = {}  # topic key -> draws not yet written
+        self._warmer = per_process(self._start_warmer)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.target = int(app.config.get('QUIZ_BANK_TARGET', self.target))
+        self.warm_interval = float(app.config.get('QUIZ_WARM_INTERVAL', self.warm_interval))
+        self.warm_topics = int(app.config.get('QUIZ_WARM_TOPICS', self.warm_topics))
+        self.warm_hours = warm_hours(app.config.get('QUIZ_WARM_HOURS'))
+
+    def generator(self, fn):
+        """Register fn(student_class, subject, topic, count) -> questions."""
+        self._generate = fn
+        return fn
+
+    # ---- request path ------------------------------------------------------
+
+    def draw(self, student_class, subject, topic, n=QUIZ_SIZE):
+        """n random banked questions, or None when the bank has too few."""
+        key = topic_key(student_class, subject, topic)
+        rows = db.session.execute(
+            select(QuizQuestion.question, QuizQuestion.options, QuizQuestion.answer)
+            .join(QuizTopic, QuizTopic.id == QuizQuestion.topic_id)
+            .where(QuizTopic.key == key)
+            .order_by(func.random())
+            .limit(n)
+        ).all()
+        if self.warm_interval > 0:
+            with self._lock:
+                self._demand[key] = self._demand.get(key, 0) + 1
+            self._ensure_warmer()
+        if len(rows) < n:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [{'question': row.question, 'options': json.loads(row.options), 'answer': row.answer} for row in rows]
+
+    def add(self, student_class, subject, topic, questions):
+        """Bank questions for the topic; returns how many were new."""
+        key = topic_key(student_class, subject, topic)
+        topic_id = db.session.execute(select(QuizTopic.id).where(QuizTopic.key == key)).scalar()
+        if topic_id is None:
+            try:
+                db.session.execute(insert(QuizTopic).values(
+                    key=key, student_class=student_class, subject=subject, topic=topic[:200],
+                    requests=1, question_count=0, last_requested_at=datetime.utcnow()))
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()  # created by a concurrent request
+            topic_id = db.session.execute(select(QuizTopic.id).where(QuizTopic.key == key)).scalar()
+        return self._store(topic_id, questions)
+
+    def flush_demand(self):
+        # Draws are counted in memory and written here, once per warm pass,
+        # so serving from the bank stays a single read.
+        with self._lock:
+            demand, self._demand = self._demand, {}
+        if not demand:
+            return
+        # Core rather than ORM update: an executemany keyed by topic key, not id.
+        topics = QuizTopic.__table__
+        db.session.execute(
+            update(topics)
+            .where(topics.c.key == bindparam('k'))
+            .values(requests=topics.c.requests + bindparam('n'), last_requested_at=datetime.utcnow()),
+            [{'k': key, 'n': count} for key, count in demand.items()],
+        )
+        db.session.commit()
+
+    def _store(self, topic_id, questions):
+        existing = set(db.session.execute(select(QuizQuestion.fingerprint).where(QuizQuestion.topic_id == topic_id)).scalars())
+        now = datetime.utcnow()
+        rows = []
+        for question in questions:
+            key = fingerprint(question)
+            if key not in existing:
+                existing.add(key)
+                rows.append({'topic_id': topic_id, 'fingerprint': key, 'question': question['question'],
+                             'options': json.dumps(question['options']), 'answer': question['answer'], 'created_at': now})
+        if not rows:
+            return 0
+        try:
+            db.session.execute(insert(QuizQuestion), rows)
+        except IntegrityError:
+            # A concurrent writer banked some of the same questions; theirs will do.
+            db.session.rollback()
+            return 0
+        count = select(func.count()).select_from(QuizQuestion).where(QuizQuestion.topic_id == topic_id).scalar_subquery()
+        db.session.execute(update(QuizTopic).where(QuizTopic.id == topic_id).values(question_count=count)
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+        return len(rows)
+
+    # ---- warming -----------------------------------------------------------
+
+    def _ensure_warmer(self):
+        if self.warm_interval > 0 and self._generate is not None and self.app is not None:
+            self._warmer()
+
+    def _start_warmer(self):
+        thread = threading.Thread(target=self._warm_loop, name="quiz-warmer", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_loop(self):
+        while True:
+            time.sleep(self.warm_interval)
+            with self.app.app_context():
+                try:
+                    self.flush_demand()
+                    if self.warm_hours is None or datetime.utcnow().hour in self.warm_hours:
+                        self.warm()
+                except Exception:
+                    log.exception("Quiz warmer error")
+                finally:
+                    db.session.remove()
+
+    def warm(self, topics=None):
+        """Top up the most requested recent topics; returns questions added."""
+        self.flush_demand()
+        now = datetime.utcnow()
+        # A topic is warmed at most once per interval, by one process.
+        cutoff = now - timedelta(seconds=max(self.warm_interval, 60))
+        fresh = or_(QuizTopic.warmed_at.is_(None), QuizTopic.warmed_at < cutoff)
+        candidates = db.session.execute(
+            select(QuizTopic.id)
+            .where(QuizTopic.question_count < self.target, QuizTopic.last_requested_at >= now - timedelta(days=self.recent_days), fresh)
+            .order_by(QuizTopic.requests.desc())
+            .limit(topics or self.warm_topics)
+        ).scalars().all()
+        added = 0
+        for topic_id in candidates:
+            claimed = db.session.execute(
+                update(QuizTopic)
+                .where(QuizTopic.id == topic_id, fresh)
+                .values(warmed_at=now)
+                .returning(QuizTopic.student_class, QuizTopic.subject, QuizTopic.topic, QuizTopic.question_count)
+                .execution_options(synchronize_session=False)
+            ).first()
+            db.session.commit()
+            if claimed is None:
+                continue
+            count = min(self.batch, self.target - claimed.question_count)
+            try:
+                questions = self._generate(claimed.student_class, claimed.subject, claimed.topic, count)
+            except InvalidQuiz as e:
+                log.warning("Quiz warmer got a malformed quiz for %r: %s", claimed.topic, e)
+                continue
+            except LLMError as e:
+                # Upstream is down or rate limiting; try again next pass.
+                log.warning("Quiz warmer stopped: %s", e.message)
+                break
+            added += self._store(topic_id, questions)
+        return added
+
+
+quiz_bank = QuizBank()
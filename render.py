@@ -0,0 +1,173 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import markdown
+from markdown.treeprocessors import Treeprocessor
+
+log = logging.getLogger(__name__)
+
+# Part of every cache key; bump it when the Markdown extensions or the PDF
+# layout change so stale renders are not served.
+RENDER_VERSION = "1"
+
+_SAFE_URL = re.compile(r"^(https?:|mailto:|#|/(?!/))", re.IGNORECASE)
+_LOCAL_LINK = re.compile(r'<a(?: href="#[^"]*")?>(.*?)</a>', re.DOTALL)
+
+# Core PDF fonts are Latin-1 only; LLM output is full of typographic
+# punctuation that has a plain equivalent.
+_LATIN1 = str.maketrans({
+    "‘": "'", "’": "'", "“": '"', "”": '"', "–": "-", "—": "-",
+    "…": "...", "•": "*", "−": "-", "→": "->", "←": "<-",
+    "≤": "<=", "≥": ">=", "≠": "!=", "×": "x",
+})
+
+
+class _DropUnsafeLinks(Treeprocessor):
+    def run(self, root):
+        for element in root.iter():
+            for attribute in ("href", "src"):
+                value = element.get(attribute)
+                if value is not None and not _SAFE_URL.match(value.strip()):
+                    del element.attrib[attribute]
+
+
+def content_key(*parts):
+    digest = hashlib.sha256(RENDER_VERSION.encode())
+    for part in parts:
+        digest.update(b"\0" + (part or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+def to_latin1(text):
+    return text.translate(_LATIN1).encode("latin-1", "replace").decode("latin-1")
+
+
+class RenderCache:
+    """Markdown -> HTML -> PDF, each done once per distinct content.
+
+    HTML is kept in an in-memory LRU and on disk as <sha256>.html under
+    instance/renders, keyed by the hash of the Markdown. PDFs are built from
+    that HTML with fpdf2's write_html, so headings, lists, code and tables
+    keep their structure, and are stored as <sha256>.pdf; a repeat download
+    is a file send. Raw HTML in the Markdown is escaped and javascript:
+    style links are dropped, so the HTML is safe to insert into a page.
+    """
+
+    def __init__(self, app=None, maxsize=1024, max_files=5000):
+        self.maxsize = maxsize
+        self.max_files = max_files
+        self.root = None
+        self.hits = 0
+        self.misses = 0
+        self._html = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config.get('RENDER_CACHE_DIR') or os.path.join(app.instance_path, 'renders')
+        os.makedirs(self.root, exist_ok=True)
+
+    def html(self, text):
+        key = content_key(text)
+        with self._lock:
+            cached = self._html.get(key)
+            if cached is not None:
+                self._html.move_to_end(key)
+                self.hits += 1
+                return cached
+        html = self._read(key, 'html')
+        if html is None:
+            self.misses += 1
+            html = self._markdown().convert(text or "")
+            self._write(key, 'html', html.encode('utf-8'))
+        with self._lock:
+            self._html[key] = html
+            while len(self._html) > self.maxsize:
+                self._html.popitem(last=False)
+        return html
+
+    def pdf_path(self, title, text):
+        key = content_key(title, text)
+        path = self._path(key, 'pdf')
+        if os.path.exists(path):
+            self.hits += 1
+            return path, key
+        self.misses += 1
+        try:
+            # In-page and dropped links have no destination in the PDF.
+            html = _LOCAL_LINK.sub(r"\1", self.html(text))
+            data = self._pdf(title, lambda pdf: pdf.write_html(to_latin1(html)))
+        except Exception:
+            # write_html rejects some nestings; the text still belongs in the file.
+            log.exception("Structured PDF render failed, falling back to plain text")
+            data = self._pdf(title, lambda pdf: pdf.multi_cell(0, 8, text=to_latin1(text)))
+        self._write(key, 'pdf', data)
+        return path, key
+
+    def _pdf(self, title, write_body):
+        # fpdf2 loads its font tables on import (~0.2 s); only downloads need it.
+        from fpdf import FPDF
+        pdf = FPDF()
+        pdf.set_title(to_latin1(title))
+        pdf.add_page()
+        pdf.set_font("Helvetica", style="B", size=16)
+        pdf.multi_cell(0, 10, text=to_latin1(title), align='C', new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", size=12)
+        write_body(pdf)
+        return bytes(pdf.output())
+
+    def _markdown(self):
+        # Markdown instances keep per-document state, so each thread gets one.
+        md = getattr(self._local, 'md', None)
+        if md is None:
+            md = markdown.Markdown(extensions=['fenced_code', 'tables', 'sane_lists'])
+            md.preprocessors.deregister('html_block')
+            md.inlinePatterns.deregister('html')
+            md.treeprocessors.register(_DropUnsafeLinks(md), 'drop_unsafe_links', 0)
+            self._local.md = md
+        return md.reset()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.root, f"{key}.{suffix}")
+
+    def _read(self, key, suffix):
+        if self.root is None:
+            return None
+        try:
+            with open(self._path(key, suffix), encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key, suffix, data):
+        if self.root is None:
+            return
+        tmp = self._path(key, f'{suffix}.{os.getpid()}.{threading.get_ident()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self._path(key, suffix))
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        # Oldest renders go first once the directory holds max_files.
+        entries = [e for e in os.scandir(self.root) if e.is_file() and not e.name.endswith('.tmp')]
+        if len(entries) <= self.max_files:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for entry in entries[:len(entries) - self.max_files]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+render_cache = RenderCache()
@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, inspect, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from forksafe import per_process
+from models import db, ActivityLog, DailyActivity
+
+log = logging.getLogger(__name__)
+
+COUNTERS = ('requests', 'xp', 'quizzes', 'quiz_correct', 'quiz_total')
+
+# One statement, so concurrent workers starting on an existing database
+# can't both backfill: whoever runs second finds the rollups non-empty.
+# Quiz results come from quiz_score; their ActivityLog rows only add XP.
+_BACKFILL = """
+INSERT INTO daily_activity (user_id, day, subject, requests, xp, quizzes, quiz_correct, quiz_total)
+SELECT user_id, day, subject, sum(requests), sum(xp), sum(quizzes), sum(quiz_correct), sum(quiz_total)
+FROM (
+    SELECT user_id, {day} AS day, substr(coalesce(subject, ''), 1, 200) AS subject,
+           sum(CASE WHEN action LIKE 'Completed Quiz%' THEN 0 ELSE 1 END) AS requests,
+           coalesce(sum(xp), 0) AS xp, 0 AS quizzes, 0 AS quiz_correct, 0 AS quiz_total
+    FROM activity_log GROUP BY user_id, {day}, substr(coalesce(subject, ''), 1, 200)
+    UNION ALL
+    SELECT user_id, {day}, substr(coalesce(topic, ''), 1, 200), 0, 0, count(*), coalesce(sum(score), 0), coalesce(sum(total_questions), 0)
+    FROM quiz_score GROUP BY user_id, {day}, substr(coalesce(topic, ''), 1, 200)
+) AS raw
+WHERE NOT EXISTS (SELECT 1 FROM daily_activity)
+GROUP BY user_id, day, subject
+"""
+
+_DAY = {'sqlite': 'date("timestamp")', 'postgresql': 'CAST("timestamp" AS DATE)'}
+_INSERT = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def backfill_statement(dialect):
+    return text(_BACKFILL.format(day=_DAY[dialect]))
+
+
+def _accuracy(correct, total):
+    return round(correct * 100 / total) if total else None
+
+
+class DailyRollup:
+    """Per-user daily totals kept alongside ActivityLog.
+
+    The activity_log writer hands every batch of raw rows to apply(), which
+    folds them into daily_activity with one upsert per (user, day, subject)
+    in the same transaction, so the rollups never disagree with the log.
+    Dashboards and the weekly leaderboard read the rollups, which cost
+    O(days) per user instead of O(events). Raw rows older than
+    retention_days are deleted every compact_interval seconds; their totals
+    are already in the rollups.
+    """
+
+    def __init__(self, app=None, retention_days=90, compact_interval=6 * 3600, batch_size=5000):
+        self.retention_days = retention_days
+        self.compact_interval = compact_interval
+        self.batch_size = batch_size
+        self.app = None
+        self._upserts = {}
+        self._compactor = per_process(self._start_compactor)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.retention_days = int(app.config.get('ACTIVITY_RETENTION_DAYS', self.retention_days))
+
+    def install(self):
+        # Fills freshly created rollups from the raw tables, for databases
+        # that predate them and were set up by create_all. One that predates
+        # activity_log.xp hasn't been migrated yet; this runs on every boot,
+        # `flask db upgrade` included, so leave it to migration d6c4a1f8e237.
+        name = db.engine.dialect.name
+        if name not in _DAY:
+            return
+        with db.engine.begin() as conn:
+            if 'xp' not in {column['name'] for column in inspect(conn).get_columns('activity_log')}:
+                return
+            conn.execute(backfill_statement(name))
+
+    # ---- writes ------------------------------------------------------------
+
+    def apply(self, conn, rows):
+        """Add ActivityLog row dicts to the rollups through conn (or a session)."""
+        totals = {}
+        for row in rows:
+            key = (row['user_id'], row['timestamp'].date(), (row['subject'] or '')[:200])
+            total = totals.setdefault(key, dict.fromkeys(COUNTERS, 0))
+            total['xp'] += row['xp'] or 0
+            if row.get('quiz'):
+                correct, questions = row['quiz']
+                total['quizzes'] += 1
+                total['quiz_correct'] += correct or 0
+                total['quiz_total'] += questions or 0
+            else:
+                total['requests'] += 1
+        if totals:
+            conn.execute(self._upsert(), [dict(zip(('user_id', 'day', 'subject'), key), **total) for key, total in totals.items()])
+
+    def _upsert(self):
+        name = db.engine.dialect.name
+        stmt = self._upserts.get(name)
+        if stmt is None:
+            table = DailyActivity.__table__
+            stmt = _INSERT[name](table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id, table.c.day, table.c.subject],
+                set_={column: table.c[column] + stmt.excluded[column] for column in COUNTERS},
+            )
+            self._upserts[name] = stmt
+        return stmt
+
+    # ---- compaction ----------------------------------------------------------
+
+    def start(self):
+        """Start this process's compactor; called once the worker has booted
+        (see gunicorn.conf.py), never from inside a write transaction."""
+        if self.retention_days > 0 and self.app is not None:
+            self._compactor()
+
+    def _start_compactor(self):
+        thread = threading.Thread(target=self._compact_loop, name="activity-compactor", daemon=True)
+        thread.start()
+        return thread
+
+    def _compact_loop(self):
+        while True:
+            time.sleep(self.compact_interval)
+            with self.app.app_context():
+                try:
+                    self.compact()
+                except Exception:
+                    log.exception("ActivityLog compaction failed")
+                finally:
+                    db.session.remove()
+
+    def compact(self, retention_days=None):
+        """Delete raw ActivityLog rows past retention; returns how many."""
+        cutoff = datetime.utcnow() - timedelta(days=retention_days or self.retention_days)
+        deleted = 0
+        while True:
+            # Small batches keep each write lock short on SQLite.
+            batch = select(ActivityLog.id).where(ActivityLog.timestamp < cutoff).limit(self.batch_size).scalar_subquery()
+            count = db.session.execute(delete(ActivityLog).where(ActivityLog.id.in_(batch))
+                                       .execution_options(synchronize_session=False)).rowcount
+            db.session.commit()
+            deleted += count
+            if count < self.batch_size:
+                return deleted
+
+    # ---- reads -------------------------------------------------------------
+
+    def summary(self, user_id, days=30, today=None):
+        """Totals, subject mix, quiz accuracy by topic and a per-day trend."""
+        today = today or datetime.utcnow().date()
+        since = today - timedelta(days=days - 1)
+        rows = db.session.execute(
+            select(DailyActivity.day, DailyActivity.subject, *(getattr(DailyActivity, c) for c in COUNTERS))
+            .where(DailyActivity.user_id == user_id, DailyActivity.day >= since)
+        ).all()
+        trend = {since + timedelta(days=n): dict.fromkeys(COUNTERS, 0) for n in range(days)}
+        subjects, topics = {}, {}
+        for row in rows:
+            day = trend.get(row.day)
+            if day is not None:
+                for column in COUNTERS:
+                    day[column] += getattr(row, column)
+            if row.requests:
+                subjects[row.subject or 'General'] = subjects.get(row.subject or 'General', 0) + row.requests
+            if row.quizzes:
+                topic = topics.setdefault(row.subject or 'General', [0, 0, 0])
+                topic[0] += row.quizzes
+                topic[1] += row.quiz_correct
+                topic[2] += row.quiz_total
+        correct = sum(t[1] for t in topics.values())
+        questions = sum(t[2] for t in topics.values())
+        return {
+            'days': days,
+            'xp': sum(d['xp'] for d in trend.values()),
+            'requests': sum(d['requests'] for d in trend.values()),
+            'quizzes': sum(t[0] for t in topics.values()),
+            'quiz_accuracy': _accuracy(correct, questions),
+            'streak': self.streak(user_id, today),
+            'subjects': dict(sorted(subjects.items(), key=lambda item: item[1], reverse=True)),
+            'topics': [{'topic': topic, 'quizzes': n, 'correct': c, 'total': t, 'accuracy': _accuracy(c, t)}
+                       for topic, (n, c, t) in sorted(topics.items(), key=lambda item: item[1][0], reverse=True)],
+            'trend': [{'day': day.isoformat(), 'xp': d['xp'], 'requests': d['requests'], 'quizzes': d['quizzes'],
+                       'accuracy': _accuracy(d['quiz_correct'], d['quiz_total'])} for day, d in trend.items()],
+        }
+
+    def streak(self, user_id, today=None):
+        """Consecutive active days ending today, or yesterday if today is still empty."""
+        today = today or datetime.utcnow().date()
+        days = db.session.execute(
+            select(DailyActivity.day).where(DailyActivity.user_id == user_id)
+            .group_by(DailyActivity.day).order_by(DailyActivity.day.desc()).limit(3660)
+        ).scalars()
+        expected, streak = today, 0
+        for day in days:
+            if day == expected or (streak == 0 and day == today - timedelta(days=1)):
+                streak += 1
+                expected = day - timedelta(days=1)
+            else:
+                break
+        return streak
+
+
+daily_rollup = DailyRollup()
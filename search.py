@@ -0,0 +1,102 @@
+import re
+from collections import namedtuple
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+
+from models import db, Note
+
+_TERM = re.compile(r"\w+\*?")
+
+# note_fts indexes note through FTS5's external-content mode, so the text
+# is stored once, in note. Triggers keep it in step with every insert,
+# update and delete. user_id is indexed as a token so a search only walks
+# that user's postings instead of every match in the corpus.
+FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5(
+        user_id, title, content,
+        content='note', content_rowid='id',
+        tokenize='porter unicode61', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_insert AFTER INSERT ON note BEGIN
+        INSERT INTO note_fts(rowid, user_id, title, content) VALUES (new.id, new.user_id, new.title, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_delete AFTER DELETE ON note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, user_id, title, content) VALUES ('delete', old.id, old.user_id, old.title, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_update AFTER UPDATE ON note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, user_id, title, content) VALUES ('delete', old.id, old.user_id, old.title, old.content);
+        INSERT INTO note_fts(rowid, user_id, title, content) VALUES (new.id, new.user_id, new.title, new.content);
+    END""",
+]
+
+# Snippet markers that can't occur in typed text; swapped for <mark> after
+# the note text has been HTML-escaped.
+_OPEN, _CLOSE = "\x02", "\x03"
+
+_SEARCH = text(f"""
+    SELECT note.id, note.title, note.created_at,
+           snippet(note_fts, 2, '{_OPEN}', '{_CLOSE}', '…', 16) AS snippet,
+           bm25(note_fts, 0.0, 10.0, 1.0) AS score
+    FROM note_fts JOIN note ON note.id = note_fts.rowid
+    WHERE note_fts MATCH :query
+    ORDER BY score
+    LIMIT :limit
+""").columns(created_at=db.DateTime)
+
+SearchResult = namedtuple('SearchResult', 'id title created_at snippet score')
+
+
+def match_expression(user_id, query):
+    """Turn free text into an FTS5 query for one user's notes.
+
+    Every word must match, in the title or the body. Words are quoted so
+    FTS5 operators in user input are taken literally, and a trailing *
+    makes a word a prefix. Prefixes of 2-3 characters are answered from
+    the prefix index; longer ones merge every matching term's postings, so
+    they are only used when asked for. Returns None when the text has no
+    searchable words.
+    """
+    terms = _TERM.findall(query)
+    if not terms:
+        return None
+    phrases = [f'"{term.rstrip("*")}"' + ("*" if term.endswith("*") else "") for term in terms]
+    return f'user_id:"{int(user_id)}" AND {{title content}}: ({" ".join(phrases)})'
+
+
+def _highlight(snippet):
+    return Markup(str(escape(snippet)).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>"))
+
+
+class NotesSearch:
+    def install(self):
+        # db.create_all() doesn't know about virtual tables or triggers. A
+        # freshly created index is filled from the existing notes.
+        if db.engine.dialect.name != 'sqlite':
+            return
+        with db.engine.begin() as conn:
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'note_fts'")).first()
+            for statement in FTS_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text("INSERT INTO note_fts(note_fts) VALUES ('rebuild')"))
+
+    def search(self, user_id, query, limit=20):
+        if db.engine.dialect.name != 'sqlite':
+            return self._search_like(user_id, query, limit)
+        expression = match_expression(user_id, query)
+        if expression is None:
+            return []
+        rows = db.session.execute(_SEARCH, {'query': expression, 'limit': limit}).all()
+        return [SearchResult(r.id, r.title, r.created_at, _highlight(r.snippet), r.score) for r in rows]
+
+    def _search_like(self, user_id, query, limit):
+        # Non-SQLite databases get plain substring matching, newest first.
+        pattern = f"%{query.strip()}%"
+        notes = (Note.query.filter(Note.user_id == user_id)
+                 .filter(Note.title.ilike(pattern) | Note.content.ilike(pattern))
+                 .order_by(Note.created_at.desc()).limit(limit).all())
+        return [SearchResult(n.id, n.title, n.created_at, escape(n.content[:300]), 0.0) for n in notes]
+
+
+notes_search = NotesSearch()
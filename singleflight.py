@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def flight_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one execution.
+
+    Within a process, callers that arrive while a key is in flight wait for
+    the leader and receive its value (or its exception). With a shared_dir,
+    leaders in different gunicorn workers also coordinate through a small
+    SQLite store: the first claims the key, the others poll until its value
+    is published and reuse it instead of calling upstream again. The store
+    is only locked for the claim and the publish, never across the call, and
+    a claim not published within claim_ttl seconds (a killed worker) can be
+    taken over. Values must be JSON-serializable.
+    """
+
+    def __init__(self, shared_dir=None, result_ttl=60, poll_interval=0.05, claim_ttl=180):
+        self.shared_dir = shared_dir
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.claim_ttl = claim_ttl
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+        if shared_dir:
+            self.share(shared_dir)
+
+    def init_app(self, app):
+        self.share(app.config.get('LLM_FLIGHT_DIR') or os.path.join(app.instance_path, 'flights'))
+
+    def share(self, shared_dir):
+        os.makedirs(shared_dir, exist_ok=True)
+        self.shared_dir = shared_dir
+        with self._store() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS flight (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS flight_claim (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)")
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = self._shared(key, fn) if self.shared_dir else fn()
+            return call.value
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _shared(self, key, fn):
+        # Poll with time.sleep rather than block: it yields to the other
+        # greenlets of a gevent worker.
+        while True:
+            found, value = self._claim(key)
+            if found:
+                with self._lock:
+                    self.coalesced += 1
+                return value
+            if value:
+                break
+            time.sleep(self.poll_interval)
+        try:
+            value = fn()
+        except BaseException:
+            with self._store() as conn:
+                conn.execute("DELETE FROM flight_claim WHERE key = ?", (key,))
+            raise
+        with self._store() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM flight WHERE created_at <= ?", (time.time() - self.result_ttl,))
+            conn.execute("INSERT OR REPLACE INTO flight (key, value, created_at) VALUES (?, ?, ?)",
+                         (key, json.dumps(value), time.time()))
+            conn.execute("DELETE FROM flight_claim WHERE key = ? OR expires_at <= ?", (key, time.time()))
+            conn.execute("COMMIT")
+        return value
+
+    def _claim(self, key):
+        """(True, value) for a published result, else (False, whether we now lead)."""
+        now = time.time()
+        with self._store() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT value FROM flight WHERE key = ? AND created_at > ?",
+                                   (key, now - self.result_ttl)).fetchone()
+                if row:
+                    return True, json.loads(row[0])
+                if conn.execute("SELECT 1 FROM flight_claim WHERE key = ? AND expires_at > ?", (key, now)).fetchone():
+                    return False, False
+                conn.execute("INSERT OR REPLACE INTO flight_claim (key, expires_at) VALUES (?, ?)",
+                             (key, now + self.claim_ttl))
+                return False, True
+            finally:
+                conn.execute("COMMIT")
+
+    def _store(self):
+        conn = sqlite3.connect(os.path.join(self.shared_dir, "flights.db"), timeout=10, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return closing(conn)
@@ -50,8 +50,29 @@ document.addEventListener('DOMContentLoaded', () => {
             const res = await fetch('/api/ask', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ question, subject })
+                body: JSON.stringify({ question, subject, stream: true })
             });
+            if (isEventStream(res)) {
+                let answer = '';
+                let target = null;
+                await readEventStream(res, (event) => {
+                    if (event.token) {
+                        if (!target) { document.getElementById(loadingId).remove(); target = appendMessage('AI', ''); }
+                        answer += event.token;
+                        target.innerHTML = marked.parse(answer);
+                        chatContainer.scrollTop = chatContainer.scrollHeight;
+                    } else if (event.error) {
+                        document.getElementById(loadingId)?.remove();
+                        appendMessage('System', event.error);
+                    } else if (event.done) {
+                        document.getElementById(loadingId)?.remove();
+                        if (!target) appendMessage('AI', answer);
+                        else target.querySelectorAll('pre code').forEach(b => hljs.highlightElement(b));
+                        updateCredits(event.questions_left);
+                    }
+                });
+                return;
+            }
             const data = await res.json();
             document.getElementById(loadingId).remove();
             if (res.ok) {
@@ -79,6 +100,7 @@ document.addEventListener('DOMContentLoaded', () => {
         chatContainer.appendChild(div);
         div.querySelectorAll('pre code').forEach(b => hljs.highlightElement(b));
         chatContainer.scrollTop = chatContainer.scrollHeight;
+        return div.querySelector('.prose');
     }
 
     function appendLoading() {
@@ -92,6 +114,46 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
+// Server-Sent Events over fetch (POST bodies rule out EventSource)
+function isEventStream(res) {
+    return res.ok && (res.headers.get('Content-Type') || '').startsWith('text/event-stream');
+}
+
+async function readEventStream(res, onEvent) {
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        events.forEach(e => { if (e.startsWith('data: ')) onEvent(JSON.parse(e.slice(6))); });
+    }
+}
+
+// PDFs are uploaded once per file; follow-up questions send only the document id.
+const uploadedDocuments = {};
+
+async function uploadDocument(file) {
+    const key = `${file.name}:${file.size}:${file.lastModified}`;
+    if (!uploadedDocuments[key]) {
+        const fd = new FormData(); fd.append('pdf', file);
+        const res = await fetch('/api/documents', { method: 'POST', body: fd });
+        const data = await res.json();
+        if (!res.ok) throw new Error(data.error);
+        uploadedDocuments[key] = data.document_id;
+    }
+    const id = uploadedDocuments[key];
+    while (true) {
+        const data = await (await fetch(`/api/documents/${id}`)).json();
+        if (data.status === 'ready') return id;
+        if (data.status !== 'processing') { delete uploadedDocuments[key]; throw new Error(data.error || 'Could not read this PDF'); }
+        await new Promise(r => setTimeout(r, 1000));
+    }
+}
+
 let currentTool = null;
 let currentQuizData = null;
 let currentQuizTopic = "";
@@ -128,7 +190,7 @@ window.generateToolContent = async function () {
     document.getElementById('quiz-result').classList.add('hidden');
 
     let endpoint = '/api/generate-notes';
-    let body = JSON.stringify({ subject, topic });
+    let body = JSON.stringify({ subject, topic, stream: true });
     let isMultipart = false;
 
     if (currentTool === 'quiz') endpoint = '/api/generate-quiz';
@@ -136,14 +198,33 @@ window.generateToolContent = async function () {
         endpoint = '/api/vision-ask';
         const fd = new FormData(); fd.append('image', document.getElementById('vision-file').files[0]);
         body = fd; isMultipart = true;
-    } else if (currentTool === 'pdf') {
-        endpoint = '/api/pdf-chat';
-        const fd = new FormData(); fd.append('pdf', document.getElementById('pdf-file').files[0]); fd.append('question', topic);
-        body = fd; isMultipart = true;
-    }
+    } else if (currentTool === 'pdf') endpoint = '/api/pdf-chat';
 
     try {
+        if (currentTool === 'pdf') {
+            const documentId = await uploadDocument(document.getElementById('pdf-file').files[0]);
+            body = JSON.stringify({ document_id: documentId, question: topic, stream: true });
+        }
         const res = await fetch(endpoint, { method: 'POST', body, ...(isMultipart ? {} : { headers: { 'Content-Type': 'application/json' } }) });
+        if (isEventStream(res)) {
+            const resultEl = document.getElementById('tool-result-data');
+            let content = '';
+            await readEventStream(res, (event) => {
+                if (event.error) throw new Error(event.error);
+                document.getElementById('tool-loading').classList.add('hidden');
+                resultEl.classList.remove('hidden');
+                if (event.token) {
+                    content += event.token;
+                    resultEl.innerHTML = marked.parse(content);
+                } else if (event.done) {
+                    if (event.html) resultEl.innerHTML = event.html;
+                    updateCredits(event.questions_left);
+                    document.getElementById('tool-result-actions').classList.remove('hidden');
+                    window.latestContent = content;
+                }
+            });
+            return;
+        }
         const data = await res.json();
         document.getElementById('tool-loading').classList.add('hidden');
         if (!res.ok) {
@@ -160,7 +241,7 @@ window.generateToolContent = async function () {
         if (currentTool === 'quiz') { currentQuizData = data.quiz; currentQuizTopic = topic; renderQuiz(); }
         else {
             const content = data.notes || data.answer;
-            document.getElementById('tool-result-data').innerHTML = marked.parse(content);
+            document.getElementById('tool-result-data').innerHTML = data.html || marked.parse(content);
             document.getElementById('tool-result-data').classList.remove('hidden');
             document.getElementById('tool-result-actions').classList.remove('hidden');
             window.latestContent = content;
@@ -214,7 +295,7 @@ async function loadAnalytics() {
     const ctx = document.getElementById('subjectsChart').getContext('2d');
     if (window.myChart) window.myChart.destroy();
     window.myChart = new Chart(ctx, { type: 'doughnut', data: { labels: Object.keys(data.subjects), datasets: [{ data: Object.values(data.subjects), backgroundColor: ['#3b82f6', '#8b5cf6', '#ec4899', '#f59e0b', '#10b981'] }] }, options: { plugins: { legend: { position: 'bottom', labels: { color: '#9ca3af' } } } } });
-    document.getElementById('quiz-history-list').innerHTML = data.quiz_history.map(q => `<div class="flex justify-between p-3 bg-white/5 rounded-xl"><span>${q.topic}</span><span class="font-bold">${q.score}</span></div>`).join('');
+    document.getElementById('quiz-history-list').innerHTML = data.quiz_history.map(q => `<div class="flex justify-between p-3 bg-white/5 rounded-xl"><span>${escapeHtml(q.topic)}</span><span class="font-bold">${q.score}</span></div>`).join('');
 }
 
 async function loadLeaderboard() {
@@ -223,6 +304,40 @@ async function loadLeaderboard() {
     document.getElementById('leaderboard-body').innerHTML = data.map((u, i) => `<tr><td class="px-6 py-4">#${i + 1}</td><td class="px-6 py-4">${u.username}</td><td class="px-6 py-4">${u.xp}</td><td class="px-6 py-4">Lvl ${u.level}</td></tr>`).join('');
 }
 
+// Infinite scroll: the server renders the first page, later pages come from
+// the JSON list APIs using the cursor of the last row shown.
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text ?? '';
+    return div.innerHTML;
+}
+
+const listRows = {
+    notes: n => `<div class="glass-panel rounded-xl p-6 hover:bg-white/5 transition-all group relative"><h3 class="text-xl font-bold text-blue-400 mb-2 pr-8">${escapeHtml(n.title)}</h3><div class="text-gray-400 text-sm mb-4 prose prose-invert line-clamp-4">${escapeHtml(n.snippet)}</div><div class="flex justify-between items-center text-xs text-gray-500 border-t border-white/5 pt-4"><span>${n.created_at.slice(0, 10)}</span><a href="/notes/delete/${n.id}" class="text-red-400 hover:text-red-300 opacity-0 group-hover:opacity-100 transition-opacity">Delete</a></div></div>`,
+    scores: s => `<tr class="border-t border-white/5"><td class="px-6 py-4">${s.timestamp.slice(0, 10)}</td><td class="px-6 py-4">${escapeHtml(s.topic)}</td><td class="px-6 py-4 font-bold">${s.score}/${s.total}</td></tr>`,
+};
+
+document.addEventListener('DOMContentLoaded', () => {
+    document.querySelectorAll('[data-next-cursor]').forEach(button => {
+        const list = document.getElementById(button.dataset.list);
+        const loadMore = async () => {
+            if (button.disabled || !button.dataset.nextCursor) return;
+            button.disabled = true;
+            try {
+                const res = await fetch(`${button.dataset.api}?cursor=${encodeURIComponent(button.dataset.nextCursor)}`);
+                const data = await res.json();
+                list.insertAdjacentHTML('beforeend', data[button.dataset.key].map(listRows[button.dataset.key]).join(''));
+                button.dataset.nextCursor = data.next_cursor || '';
+                if (!data.next_cursor) button.remove();
+            } finally {
+                button.disabled = false;
+            }
+        };
+        button.addEventListener('click', loadMore);
+        new IntersectionObserver(entries => { if (entries.some(e => e.isIntersecting)) loadMore(); }).observe(button);
+    });
+});
+
 // Payment Modal Logic
 window.openPaymentModal = function () {
     document.getElementById('payment-modal').classList.remove('hidden');
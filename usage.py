@@ -0,0 +1,123 @@
+from datetime import date
+
+from sqlalchemy import bindparam, case, func, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import db, User
+from activity import activity_log
+from leaderboard import leaderboard
+from usercache import user_cache
+
+DEFAULT_DAILY_LIMIT = 5
+XP_PER_LEVEL = 100
+
+
+def quota_remaining(user):
+    # Read-only view of the quota, applying the daily reset without writing it.
+    if user.last_active_date != date.today():
+        return DEFAULT_DAILY_LIMIT
+    return (user.daily_limit or 0) - (user.questions_today or 0)
+
+
+# Conditional on the stored date, not the instance's, which may come from
+# user_cache: another worker may already have reset and charged today.
+_RESET = (
+    update(User)
+    .where(User.id == bindparam("user_id"), or_(User.last_active_date.is_(None), User.last_active_date != bindparam("today")))
+    .values({User.questions_today: 0, User.daily_limit: DEFAULT_DAILY_LIMIT, User.last_active_date: bindparam("today")})
+    .returning(User.questions_today, User.daily_limit, User.last_active_date)
+    .execution_options(synchronize_session=False)
+)
+_RAISE_LIMIT = (
+    update(User).where(User.id == bindparam("user_id"))
+    .values({User.daily_limit: User.daily_limit + bindparam("amount")})
+    .returning(User.daily_limit)
+    .execution_options(synchronize_session=False)
+)
+
+
+def _store(user, row):
+    # Copy the returned row onto the instance so views reading the new
+    # totals don't trigger a refresh SELECT.
+    for key, value in row._mapping.items():
+        set_committed_value(user, key, value)
+    user_cache.update(user.id, row._mapping)
+
+
+def reset_if_new_day(user):
+    if user.last_active_date == date.today():
+        return
+    row = db.session.execute(_RESET, {"user_id": user.id, "today": date.today()}).first()
+    db.session.commit()
+    if row is None:
+        # Already reset today elsewhere; the instance was stale.
+        user_cache.invalidate(user.id)
+        db.session.refresh(user)
+    else:
+        _store(user, row)
+
+
+def raise_daily_limit(user, amount=1):
+    """Add amount to today's limit in one UPDATE; returns the new limit."""
+    row = db.session.execute(_RAISE_LIMIT, {"user_id": user.id, "amount": amount}).first()
+    db.session.commit()
+    _store(user, row)
+    return row.daily_limit
+
+
+def _charge_statement(consume_quota):
+    # Built once per variant with bind parameters; constructing the CASE
+    # expressions per call costs more than the UPDATE itself.
+    amount = bindparam("amount")
+    today = bindparam("today")
+    xp = func.coalesce(User.xp, 0)
+    level = func.coalesce(User.level, 1)
+    new_level = (xp + amount) // XP_PER_LEVEL + 1
+    levelled_up = new_level > level
+    values = {
+        User.xp: xp + amount,
+        User.level: case((levelled_up, new_level), else_=level),
+    }
+    stmt = update(User).where(User.id == bindparam("user_id"))
+    if consume_quota:
+        stale = or_(User.last_active_date.is_(None), User.last_active_date != today)
+        values.update({
+            User.questions_today: case((stale, 1), else_=User.questions_today + 1),
+            User.daily_limit: case((stale, DEFAULT_DAILY_LIMIT), else_=User.daily_limit) + case((levelled_up, 1), else_=0),
+            User.last_active_date: today,
+            User.total_questions_asked: func.coalesce(User.total_questions_asked, 0) + 1,
+        })
+        stmt = stmt.where(or_(stale, User.questions_today < User.daily_limit))
+    else:
+        values[User.daily_limit] = User.daily_limit + case((levelled_up, 1), else_=0)
+    return stmt.values(values).returning(
+        User.xp, User.level, User.daily_limit, User.questions_today,
+        User.last_active_date, User.total_questions_asked,
+        User.username, User.student_class,
+    ).execution_options(synchronize_session=False)
+
+
+_CHARGE = {True: _charge_statement(True), False: _charge_statement(False)}
+
+
+def record_usage(user, amount, subject=None, action=None, consume_quota=True, quiz=None):
+    """Charge one AI request and award XP in a single transaction.
+
+    The daily reset, quota check, counter increments and level-up all happen
+    in one UPDATE ... RETURNING, committed once; the ActivityLog row goes
+    through the buffered activity_log writer. The quota condition lives in
+    the UPDATE's WHERE clause, so concurrent requests can never push
+    questions_today past daily_limit. Returns the questions left today, or None when the quota was
+    already used up and nothing was charged. quiz is (correct, questions)
+    for a completed quiz, for the accuracy in the daily rollups.
+    """
+    params = {"user_id": user.id, "amount": amount, "today": date.today()}
+    row = db.session.execute(_CHARGE[consume_quota], params).first()
+    if row is None:
+        db.session.rollback()
+        return None
+    activity_log.log(subject, action, user.id, xp=amount, quiz=quiz)
+    db.session.commit()
+    _store(user, row)
+    leaderboard.record(user, gained=amount)
+    return row.daily_limit - row.questions_today
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+
+from models import db, User
+
+_COLUMNS = [column.key for column in User.__table__.columns]
+
+
+class UserCache:
+    """Per-process LRU of User rows for Flask-Login's user_loader.
+
+    Rows are kept as plain column dicts. A hit rebuilds a detached User and
+    merges it into the request's session with load=False, so the view gets a
+    normal session-bound instance without a SELECT. ORM writes to a User
+    evict its entry; record_usage's Core UPDATE pushes its RETURNING values
+    in through update(). Other workers' writes show up within ttl seconds.
+    """
+
+    def __init__(self, maxsize=10000, ttl=5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()  # user_id -> (expires_at, column dict)
+        self._lock = threading.Lock()
+
+    def load(self, user_id):
+        if self.ttl <= 0:
+            return db.session.get(User, user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._rows.get(user_id)
+            if entry and entry[0] > now:
+                self._rows.move_to_end(user_id)
+                self.hits += 1
+                row = entry[1]
+            else:
+                row = None
+                self.misses += 1
+        if row is None:
+            user = db.session.get(User, user_id)
+            if user is not None:
+                self._store(user_id, {key: getattr(user, key) for key in _COLUMNS})
+            return user
+        user = User(**row)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def update(self, user_id, values):
+        with self._lock:
+            entry = self._rows.get(user_id)
+            if entry:
+                self._rows[user_id] = (entry[0], dict(entry[1], **values))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._rows.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+    def _store(self, user_id, row):
+        with self._lock:
+            self._rows[user_id] = (time.monotonic() + self.ttl, row)
+            self._rows.move_to_end(user_id)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _evict_user(mapper, connection, target):
+    user_cache.invalidate(target.id)